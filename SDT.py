@@ -1,6 +1,7 @@
 # Smart Docketing Tool
 # 
-# NOTE: This deals ONLY with standard docket-number input, i.e., no variations.
+# NOTE: This deals ONLY with standard docket-number input, i.e., no variations,
+# except for normalize_docket_number (see NORMALIZATION, below).
 # Juvenile Court not included. 
 #
 # DOCKET-NUMBER FORMATS (STANDARD)
@@ -56,6 +57,7 @@
 #       docket number 'ES00A0000XY' should raise an error, because the docket num-
 #       ber tell us that the case TYPE is 'Proxy Guardianship' ('XY') but that
 #       the case GROUP is 'Adoption' ('A') instead of 'Proxy Guardianship' ('X').
+#       See probate_family_court_case_type_group_dict, below.
 #
 #   7.  Appeals Court           Example: 2020-P-0874
 #
@@ -190,7 +192,7 @@
 #   if the docket number is not strictly entered in the standardized format,
 #   including all the leading 0s.
 #
-# NOTES ON BELOW CASE-TYPE CODE DICTIONARIES
+# NOTES ON THE CASE-TYPE CODE DICTIONARIES
 #
 #   The 'AD' case-type code in BMC and district courts refers to 'Appeal' but
 #   'Adoption' in probate and family courts. Because of dict key restrictions,
@@ -198,236 +200,460 @@
 #   Land Court case-type codes are also in their own dictionary for checking if
 #   the docket number is erroneously missing a court code or if the court code
 #   is missing because it is a case in Land Court.
+#
+#   probate_family_court_case_type_group_dict lists the case-group codes that go
+#   with each Probate and Family Court case-type code, so that, e.g.,
+#   'ES00A0000XY' can be flagged: case type 'XY' (Proxy Guardianship) is never
+#   in case group 'A' (Adoption). Most follow from the names. 'CS', 'CW', and
+#   'PE' are less clear, so every group they could plausibly be filed under is
+#   allowed.
 
-court_case_type_code_dict = {
-    'AC' : 'Application for Criminal Complaint',
-    'AD' : 'Appeal',
-    'BP' : 'Bail Petition',
-    'CI' : 'Civil Infraction',
-    'CR' : 'Criminal',
-    'CV' : 'Civil',
-    'IC' : 'Interstate Compact',
-    'IN' : 'Inquest',
-    'MH' : 'Mental Health',
-    'MV' : 'Motor Vehicle',
-    'PC' : 'Probable Cause',
-    'RO' : 'Abuse Prevention Order',
-    'SC' : 'Small Claims',
-    'SP' : 'Supplementary Process',
-    'SU' : 'Summary Process',
-    'SW' : 'Administrative Search Warrant',
-    'TK' : 'Ticket Hearings',
-    'PS' : 'Permit Session',
-    'SM' : 'Service Members',
-    'TL' : 'Tax Lien',
-    'REG': 'Registration',
-    'SBQ': 'Subsequent',
-    'MISC': 'Miscellaneous'
-}
+import bisect
+import enum
+import functools
+import heapq
+import io
+import itertools
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque, namedtuple
+from types import MappingProxyType
 
-land_court_case_type_code_dict = {
-    'PS' : 'Permit Session',
-    'SM' : 'Service Members',
-    'TL' : 'Tax Lien',
-    'REG': 'Registration',
-    'SBQ': 'Subsequent',
-    'MISC': 'Miscellaneous'
-}
+# CODE TABLES
+#
+#   The code dictionaries are data rather than code. They are kept in
+#   sdt_codes.json next to this file (or the file named by the SDT_CODE_TABLES
+#   environment variable), with a "version" string to change whenever they do:
+#
+#       court_case_type_code_dict
+#       land_court_case_type_code_dict
+#       probate_family_court_case_type_code_dict
+#       probate_family_court_case_group_code_dict
+#       probate_family_court_case_type_group_dict
+#       court_name_code_dict
+#       appellate_court_code_dict
+#
+#   Decoding the JSON takes longer than building every index from it. If the
+#   SDT_CODE_TABLE_CACHE environment variable names a directory, then
+#   read_code_tables keeps a marshalled copy of the tables there, keyed on the
+#   path, size, and modification time of the JSON file, and loads that while it
+#   is fresh. Nothing is written anywhere unless it is set. The tables are
+#   checked either way.
+#
+#   reload_code_tables reads the file again and swaps in the new tables, the
+#   indexes built from them (see CODE INDEXES), and code_table_version with
+#   one globals().update, which other threads cannot interleave with. Every
+#   ParseCache empties itself the next time it is used. Long-running workers
+#   can call reload_code_tables_if_changed between batches; it only stats the
+#   file unless the file has changed. Invalid tables raise ValueError and leave
+#   the old tables in place.
+#
+#   Nothing is loaded at import. The code dictionaries and the indexes start
+#   out as Deferred stand-ins, and the first use of any of them calls
+#   use_code_tables, which loads the tables as reload_code_tables does;
+#   code_table_version is None until then. Likewise the regexes are compiled on
+#   first use (see deferred_regex): compiling them all takes about 20 ms, most
+#   of what importing this module used to cost, and a process that only packs
+#   docket numbers never needs the variant regexes. A Deferred stand-in
+#   replaces itself in the module globals, so only the first use goes through
+#   it. parse_many, which copies tables into local variables for its loop,
+#   calls use_code_tables first.
+#
+#   The order of the codes in each dictionary is part of the packed format (see
+#   PACKED DOCKET NUMBERS), so new codes must be added at the end: a reload
+#   whose tables remove or reorder codes is refused with ValueError, since
+#   numbers packed before it would unpack differently after it. Tables must
+#   also have case groups for every Probate and Family Court case type and the
+#   appellate court codes written into the docket number regexes.
 
-probate_family_court_case_type_code_dict = {
-    'AB' : 'Protection from Abuse',
-    'AD' : 'Adoption',
-    'CA' : 'Change of Name',
-    'CS' : 'Custody, Support, and Parenting Time',
-    'CW' : 'Child Welfare',
-    'DO' : 'Domestic Relations, Other',
-    'DR' : 'Domestic Relations',
-    'EA' : 'Estates and Administration',
-    'GD' : 'Guardianship',
-    'JP' : 'Joint Petition',
-    'PE' : 'Paternity in Equity',
-    'PM' : 'Probate Abuse / Conservator',
-    'PO' : 'Probate, Other',
-    'PP' : 'Equity-Partition',
-    'QC' : 'Equity Complaint',
-    'QP' : 'Equity Petition',
-    'SK' : 'Wills for Safekeeping',
-    'WD' : 'Paternity',
-    'XY' : 'Proxy Guardianship'
-}
+code_table_path = os.environ.get('SDT_CODE_TABLES') or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'sdt_codes.json')
 
-probate_family_court_case_group_code_dict = {
-    'A' : 'Adoption',
-    'C' : 'Change of Name',
-    'D' : 'Domestic Relations',
-    'E' : 'Equity',
-    'W' : 'Paternity',
-    'P' : 'Probate',
-    'R' : 'Protection from Abuse',
-    'X' : 'Proxy Guardianship',
-    'S' : 'Wills for Safekeeping'
-}
+code_table_cache_directory = os.environ.get('SDT_CODE_TABLE_CACHE')
+# None for no marshalled copy
 
-court_name_code_dict = {
-    '01' : 'Boston Municipal Court (BMC) Central',
-    '02' : 'Boston Municipal Court (BMC) Roxbury',
-    '03' : 'Boston Municipal Court (BMC) South Boston',
-    '04' : 'Boston Municipal Court (BMC) Charlestown',
-    '05' : 'Boston Municipal Court (BMC) East Boston',
-    '06' : 'Boston Municipal Court (BMC) West Roxbury',
-    '07' : 'Boston Municipal Court (BMC) Dorchester',
-    '08' : 'Boston Municipal Court (BMC) Brighton',
-    '09' : 'Brookline District Court',
-    '10' : 'Somerville District Court',
-    '11' : 'Lowell District Court',
-    '12' : 'Newton District Court',
-    '13' : 'Lynn District Court',
-    '14' : 'Chelsea District Court',
-    '15' : 'Brockton District Court',
-    '16' : 'Fitchburg District Court',
-    '17' : 'Holyoke District Court',
-    '18' : 'Lawrence District Court',
-    '20' : 'Chicopee District Court',
-    '21' : 'Marlboro District Court',
-    '22' : 'Newburyport District Court',
-    '23' : 'Springfield District Court',
-    '25' : 'Barnstable District Court',
-    '26' : 'Orleans District Court',
-    '27' : 'Pittsfield District Court',
-    '28' : 'Northern Berkshire District Court',
-    '29' : 'Southern Berkshire District Court',
-    '31' : 'Taunton District Court',
-    '32' : 'Fall River District Court',
-    '33' : 'New Bedford District Court',
-    '34' : 'Attleboro District Court',
-    '35' : 'Edgartown District Court',
-    '36' : 'Salem District Court',
-    '38' : 'Haverhill District Court',
-    '39' : 'Gloucester District Court',
-    '40' : 'Ipswich District Court',
-    '41' : 'Greenfield District Court',
-    '42' : 'Orange District Court',
-    '43' : 'Palmer District Court',
-    '44' : 'Westfield District Court',
-    '45' : 'Northampton District Court',
-    '47' : 'Concord District Court',
-    '48' : 'Ayer District Court',
-    '49' : 'Framingham District Court',
-    '50' : 'Malden District Court',
-    '51' : 'Waltham District Court',
-    '52' : 'Cambridge District Court',
-    '53' : 'Woburn District Court',
-    '54' : 'Dedham District Court',
-    '55' : 'Stoughton District Court',
-    '56' : 'Quincy District Court',
-    '57' : 'Wrentham District Court',
-    '58' : 'Hingham District Court',
-    '59' : 'Plymouth District Court',
-    '60' : 'Wareham District Court',
-    '61' : 'Leominster District Court',
-    '62' : 'Worcester District Court',
-    '63' : 'Gardner District Court',
-    '64' : 'Dudley District Court',
-    '65' : 'Uxbridge District Court',
-    '66' : 'Milford District Court',
-    '67' : 'Westborough District Court',
-    '68' : 'Clinton District Court',
-    '69' : 'East Brookfield District Court',
-    '70' : 'Winchendon District Court',
-    '72' : 'Barnstable County Superior Court',
-    '73' : 'Bristol County Superior Court',
-    '74' : 'Dukes County Superior Court',
-    '75' : 'Nantucket County Superior Court',
-    '76' : 'Berkshire County Superior Court',
-    '77' : 'Essex County Superior Court',
-    '78' : 'Franklin County Superior Court',
-    '79' : 'Hampden County Superior Court',
-    '80' : 'Hampshire County Superior Court',
-    '81' : 'Middlesex County Superior Court',
-    '82' : 'Norfolk County Superior Court',
-    '83' : 'Plymouth County Superior Court',
-    '84' : 'Suffolk County Superior Court',
-    '85' : 'Worcester County Superior Court',
-    '86' : 'Peabody District Court',
-    '87' : 'Natick District Court',
-    '88' : 'Nantucket District Court',
-    '89' : 'Falmouth District Court',
-    '98' : 'Eastern Hampshire District Court',
-    'H77': 'Northeast Housing Court',
-    'H79': 'Springfield Housing Court',
-    'H83': 'Southeast Housing Court',
-    'H84': 'Boston Housing Court',
-    'H85': 'Worcester Housing Court',
-    'ES' : 'Essex Probate and Family Court',
-    'BA' : 'Barnstable Probate and Family Court',
-    'BE' : 'Berkshire Probate and Family Court',
-    'BR' : 'Bristol Probate and Family Court',
-    'DU' : 'Dukes Probate and Family Court',
-    'FR' : 'Franklin Probate and Family Court',
-    'HD' : 'Hampden Probate and Family Court',
-    'HS' : 'Hampshire Probate and Family Court',
-    'MI' : 'Middlesex Probate and Family Court',
-    'NA' : 'Nantucket Probate and Family Court',
-    'NO' : 'Norfolk Probate and Family Court',
-    'PL' : 'Plymouth Probate and Family Court',
-    'SU' : 'Suffolk Probate and Family Court',
-    'WO' : 'Worcester Probate and Family Court',
-}
+code_table_name_list = [
+    'court_case_type_code_dict',
+    'land_court_case_type_code_dict',
+    'probate_family_court_case_type_code_dict',
+    'probate_family_court_case_group_code_dict',
+    'probate_family_court_case_type_group_dict',
+    'court_name_code_dict',
+    'appellate_court_code_dict'
+]
 
-appellate_court_code_dict = {
-    'P'  : 'Appeals Court',
-    'J'  : 'Appeals Court (Single Justice)',
-    'SJC': 'Supreme Judicial Court',
-    'SJ' : 'Supreme Judicial Court (Single Justice)',
-    'BD' : 'Supreme Judicial Court (Bar Docket)'
-}
+appellate_court_code_list = ['P', 'J', 'SJC', 'SJ', 'BD']
+# Written into docket_number_re and docket_number_variant_re, so every set of
+# code tables must have them.
 
-import re
-import time
-from collections import namedtuple
+packed_code_table_name_list = [
+    'court_case_type_code_dict',
+    'land_court_case_type_code_dict',
+    'probate_family_court_case_type_code_dict',
+    'probate_family_court_case_group_code_dict',
+    'court_name_code_dict',
+    'appellate_court_code_dict'
+]
+# The dictionaries whose order is part of the packed format
+
+code_table_lock = threading.Lock()
+# Held while the code tables are being replaced, so reloads do not overlap.
+
+code_table_key = None
+# (size, modification time) of code_table_path when it was last loaded, or
+# None before the first load
+
+code_table_version = None
+
+code_table_generation = 0
+# Counts loads of the code tables, so each ParseCache can tell when to empty.
+
+class Deferred:
+    # Stands in for the module global name until it is first used. load()
+    # must replace the global; every use of the stand-in goes to the new
+    # value, so references taken before the load keep working.
+
+    __slots__ = ('name', 'load')
+
+    def __init__(self, name, load):
+        self.name = name
+        self.load = load
+
+    def resolve(self):
+        value = globals()[self.name]
+        if value is self:
+            self.load()
+            value = globals()[self.name]
+        return value
+
+    def __getattr__(self, attribute):
+        return getattr(self.resolve(), attribute)
+
+    def __getitem__(self, key):
+        return self.resolve()[key]
+
+    def __contains__(self, key):
+        return key in self.resolve()
+
+    def __iter__(self):
+        return iter(self.resolve())
+
+    def __len__(self):
+        return len(self.resolve())
+
+    def __bool__(self):
+        return bool(self.resolve())
+
+    def __eq__(self, other):
+        return self.resolve() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.resolve())
+
+def deferred_regex(name, pattern, flags=0):
+    # Returns a Deferred stand-in for the global name that compiles pattern.
+    def compile_regex():
+        globals()[name] = re.compile(pattern, flags)
+    return Deferred(name, compile_regex)
+
+def check_code_tables(data):
+    # Returns (version, tables) from decoded JSON, or raises ValueError.
+    if not isinstance(data, dict) or not isinstance(data.get('version'), str):
+        raise ValueError('Code tables need a "version" string')
+    tables = {}
+    for name in code_table_name_list:
+        table = data.get(name)
+        if not isinstance(table, dict) or not table:
+            raise ValueError('Code tables need a non-empty "%s"' % name)
+        for code, value in table.items():
+            if not code or code != code.upper() or not isinstance(value, str):
+                raise ValueError('Bad code in "%s": %r' % (name, code))
+        tables[name] = table
+    for code, groups in \
+            tables['probate_family_court_case_type_group_dict'].items():
+        if code not in tables['probate_family_court_case_type_code_dict'] or \
+                not set(groups) <= set(
+                    tables['probate_family_court_case_group_code_dict']):
+            raise ValueError('Bad case groups for case type ' + code)
+    for code in tables['probate_family_court_case_type_code_dict']:
+        if code not in tables['probate_family_court_case_type_group_dict']:
+            raise ValueError('No case groups for case type ' + code)
+    for code in appellate_court_code_list:
+        if code not in tables['appellate_court_code_dict']:
+            raise ValueError('Missing appellate court code ' + code)
+    return data['version'], tables
+
+def check_code_order(tables):
+    # Raises ValueError unless each dictionary in tables starts with the codes
+    # of the one in use, in the same order.
+    for name in packed_code_table_name_list:
+        codes = list(globals()[name])
+        if list(tables[name])[:len(codes)] != codes:
+            raise ValueError('Codes in "%s" were removed or reordered; new '
+                             'codes go at the end' % name)
+
+def read_code_tables(path):
+    # Returns (key, version, tables), from the marshalled copy if there is a
+    # fresh one.
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    if not code_table_cache_directory:
+        return (key,) + load_code_tables(path)
+    path = os.path.abspath(path)
+    cache_path = os.path.join(code_table_cache_directory,
+                              os.path.basename(path) + '.marshal')
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_path, cached_key, data = marshal.load(f)
+        if cached_path == path and cached_key == key:
+            return (key,) + check_code_tables(data)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+        # Missing, stale, or not marshalled tables: load the JSON instead.
+    version, tables = load_code_tables(path)
+    try:
+        os.makedirs(code_table_cache_directory, exist_ok=True)
+        temp_path = '%s.%d' % (cache_path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            marshal.dump((path, key, dict(tables, version=version)), f)
+        os.replace(temp_path, cache_path)
+        # Written and renamed, so other processes never read half a file.
+    except OSError:
+        pass
+        # An unwritable cache directory decodes the JSON every time instead.
+    return key, version, tables
+
+def load_code_tables(path):
+    # Returns (version, tables) from the JSON file.
+    import json
+    with open(path, encoding='utf-8') as f:
+        return check_code_tables(json.load(f))
+
+def install_code_tables(version, tables):
+    # Callers hold code_table_lock.
+    namespace = dict(tables, code_table_version=version,
+                     code_table_generation=code_table_generation + 1)
+    namespace.update(code_indexes(tables))
+    globals().update(namespace)
+
+def swap_code_tables(path):
+    # Callers hold code_table_lock. Returns the version of the tables loaded.
+    global code_table_path, code_table_key
+    key, version, tables = read_code_tables(path)
+    if code_table_key is not None:
+        check_code_order(tables)
+    install_code_tables(version, tables)
+    code_table_path, code_table_key = path, key
+    return version
+
+def reload_code_tables(path=None):
+    # Returns the version of the tables now in use. A path given here is the
+    # one reload_code_tables_if_changed watches from then on.
+    with code_table_lock:
+        return swap_code_tables(path or code_table_path)
+
+def use_code_tables():
+    # Loads the code tables unless they have been loaded already.
+    if code_table_key is None:
+        with code_table_lock:
+            if code_table_key is None:
+                swap_code_tables(code_table_path)
 
-find_court_code_re = re.compile(r'(?<=^\d{2})(\d{2}|H\d{2})(?!-)|^[A-Z]{2}'
-                                r'(?=\d{2})', re.I)
+def reload_code_tables_if_changed():
+    # Returns True if the code tables were reloaded.
+    stat = os.stat(code_table_path)
+    if (stat.st_size, stat.st_mtime_ns) == code_table_key:
+        return False
+    reload_code_tables()
+    return True
 
-find_case_type_code_re = re.compile(r'(?<!^)[A-Z]{2,4}(?!-)', re.I)
+find_court_code_re = deferred_regex(
+    'find_court_code_re',
+    r'(?<=^\d{2})(\d{2}|H\d{2})(?!-)|^[A-Z]{2}(?=\d{2})', re.I)
 
-find_year_re = re.compile(r'^\d{2}(?=\d{2}[A-Z]|H|\s)|(?<=^[A-Z]{2})\d{2}|'
-                          r'\d{4}(?=-)', re.I)
+find_case_type_code_re = deferred_regex('find_case_type_code_re',
+                                        r'(?<!^)[A-Z]{2,4}(?!-)', re.I)
 
-find_sequence_number_re = re.compile(r'\d{2,}(?=$|[A-Z]+$)', re.I)
+find_year_re = deferred_regex(
+    'find_year_re',
+    r'^\d{2}(?=\d{2}[A-Z]|H|\s)|(?<=^[A-Z]{2})\d{2}|\d{4}(?=-)', re.I)
 
-check_proper_format_re = re.compile(r'^\d{4}[A-Z]{2}\d{1,6}$|'
-                                    # BMC, Dist. Ct., Super. Ct.
-                                    r'^\d{2}H\d{2}[A-Z]{2}\d{1,6}$|'
-                                    # Housing Court
-                                    r'^\d{2}\s[A-Z]{2,4}\s\d{1,6}(?:$|'
-                                    r'\s\d{2}-\d+$)|'
-                                    # Land Court
-                                    r'^[A-Z]{2}\d{2}[A-Z]\d+[A-Z]{2}$|'
-                                    # Probate and Family Court
-                                    r'^\d{4}-(J|P)-\d+$|'
-                                    # Appeals Court
-                                    r'^(BD|SJ)-\d{4}-\d+$|^SJC-\d+$', re.I)
-                                    # Supreme Judicial Court
+find_sequence_number_re = deferred_regex('find_sequence_number_re',
+                                         r'\d{2,}(?=$|[A-Z]+$)', re.I)
+
+check_proper_format_re = deferred_regex('check_proper_format_re',
+                                        r'^\d{4}[A-Z]{2}\d{1,6}$|'
+                                        # BMC, Dist. Ct., Super. Ct.
+                                        r'^\d{2}H\d{2}[A-Z]{2}\d{1,6}$|'
+                                        # Housing Court
+                                        r'^\d{2}\s[A-Z]{2,4}\s\d{1,6}(?:$|'
+                                        r'\s\d{2}-\d+$)|'
+                                        # Land Court
+                                        r'^[A-Z]{2}\d{2}[A-Z]\d+[A-Z]{2}$|'
+                                        # Probate and Family Court
+                                        r'^\d{4}-(J|P)-\d+$|'
+                                        # Appeals Court
+                                        r'^(BD|SJ)-\d{4}-\d+$|^SJC-\d+$',
+                                        re.I)
+                                        # Supreme Judicial Court
+
+# CODE INDEXES
+#
+#   Built from the code dictionaries by code_indexes, whenever the code tables
+#   are loaded (see CODE TABLES). After changing a dictionary in place, call
+#   build_code_indexes to rebuild them. All are read-only, and all but the last
+#   two start out as Deferred stand-ins.
+#
+#   court_code_trie         Trie of the Land Court case-type codes and the
+#                           appellate court codes, for finding them anywhere
+#                           in a docket number without a court code. Each
+#                           node maps a character to the next node; '' maps
+#                           to the court name of the code ending there.
+#   court_name_index        Court name -> tuple of its court codes.
+#   case_type_name_index    Case type -> tuple of its case-type codes.
+#   court_code_list         Court codes, then appellate court codes, in
+#                           dictionary order, for pack_docket_number. The
+#                           ordinals are part of the packed format, so new
+#                           codes must be added at the end of a dictionary.
+#   court_code_ordinal_dict Court code -> its index in court_code_list.
+#   case_type_code_list_dict
+#                           Format tag -> case-type codes of that format.
+#   case_type_code_ordinal_dict
+#                           Format tag -> (case-type code -> ordinal).
+#   case_group_code_list    Probate and Family Court case-group codes.
+#   superior_court_code_set Court codes of the Superior Court.
+#   probate_family_court_code_set
+#                           Court codes of the Probate and Family Court.
+#   code_correction_indexes See OCR CORRECTION, below.
+#   prefix_template_dict    See INCREMENTAL PARSING, below.
+
+def build_code_trie(code_dict):
+    trie = {}
+    for code, value in code_dict.items():
+        node = trie
+        for char in code:
+            node = node.setdefault(char, {})
+        node[''] = value
+    def freeze(node):
+        return MappingProxyType({key: value if key == '' else freeze(value)
+                                 for key, value in node.items()})
+    return freeze(trie)
+
+def find_longest_code(trie, text):
+    # Returns the value of the leftmost, longest code in trie that appears in
+    # text, or None. So 'SJC' wins over 'SJ', whatever the dictionary order.
+    text = text.upper()
+    for start in range(len(text)):
+        node = trie
+        value = None
+        for char in text[start:]:
+            node = node.get(char)
+            if node is None:
+                break
+            value = node.get('', value)
+        if value is not None:
+            return value
+    return None
+
+def build_code_reverse_index(*code_dicts):
+    index = {}
+    for code_dict in code_dicts:
+        for code, name in code_dict.items():
+            if code not in index.setdefault(name, ()):
+                index[name] += (code,)
+    return MappingProxyType(index)
+
+def code_indexes(tables):
+    # Returns {index name: index} for the code dictionaries in tables.
+    court_codes = dict.fromkeys(tables['land_court_case_type_code_dict'],
+                                'Land Court')
+    court_codes.update(tables['appellate_court_code_dict'])
+    court_code_list = tuple(tables['court_name_code_dict']) + \
+        tuple(tables['appellate_court_code_dict'])
+    case_type_code_list_dict = {
+        'trial'  : tuple(tables['court_case_type_code_dict']),
+        'housing': tuple(tables['court_case_type_code_dict']),
+        'land'   : tuple(tables['land_court_case_type_code_dict']),
+        'sbq'    : tuple(tables['land_court_case_type_code_dict']),
+        'probate': tuple(tables['probate_family_court_case_type_code_dict'])
+    }
+    return {
+        'court_code_trie': build_code_trie(court_codes),
+        'court_name_index': build_code_reverse_index(
+            tables['court_name_code_dict'],
+            tables['appellate_court_code_dict']),
+        'case_type_name_index': build_code_reverse_index(
+            tables['court_case_type_code_dict'],
+            tables['land_court_case_type_code_dict'],
+            tables['probate_family_court_case_type_code_dict']),
+        'court_code_list': court_code_list,
+        'court_code_ordinal_dict': MappingProxyType(
+            {code: i for i, code in enumerate(court_code_list)}),
+        'case_type_code_list_dict': MappingProxyType(case_type_code_list_dict),
+        'case_type_code_ordinal_dict': MappingProxyType({
+            docket_format: MappingProxyType(
+                {code: i for i, code in enumerate(codes)})
+            for docket_format, codes in case_type_code_list_dict.items()}),
+        'case_group_code_list': tuple(
+            tables['probate_family_court_case_group_code_dict']),
+        'superior_court_code_set': frozenset(
+            code for code, name in tables['court_name_code_dict'].items()
+            if 'Superior' in name),
+        'probate_family_court_code_set': frozenset(
+            code for code, name in tables['court_name_code_dict'].items()
+            if 'Probate' in name),
+        'code_correction_indexes': {},
+        # Built on first use by code_correction_index.
+        'prefix_template_dict': None
+        # Built on first use by prefix_templates.
+    }
+
+def build_code_indexes():
+    # Rebuilds the indexes after the code dictionaries are changed in place.
+    use_code_tables()
+    with code_table_lock:
+        install_code_tables(code_table_version, {
+            name: globals()[name] for name in code_table_name_list})
+
+code_index_name_list = [
+    'court_code_trie',
+    'court_name_index',
+    'case_type_name_index',
+    'court_code_list',
+    'court_code_ordinal_dict',
+    'case_type_code_list_dict',
+    'case_type_code_ordinal_dict',
+    'case_group_code_list',
+    'superior_court_code_set',
+    'probate_family_court_code_set'
+]
+
+for name in code_table_name_list + code_index_name_list:
+    globals()[name] = Deferred(name, use_code_tables)
+del name
+
+code_correction_indexes = {}
+
+prefix_template_dict = None
 
 def identify_court_name(docket_number):
-    court_code = find_court_code_re.search(docket_number).group()
+    match = find_court_code_re.search(docket_number)
+    court_code = match and match.group().upper()
     if not court_code:
-        for key in land_court_case_type_code_dict:
-            if key in docket_number:
-                return 'Land Court'
-        else:
-            for key in appellate_court_code_dict:
-                if key in docket_number:
-                    return appellate_court_code_dict[key]
-            else:
-                return None
-                # The docket number is missing court code. Currently, because
-                # the initial check_proper_format check excludes docket numbers
-                # missing court codes (or at least what appears to be court
-                # codes), this part is superfluous but won't be once the code
-                # is edited to address variations, which might not include
-                # court codes.
+        return find_longest_code(court_code_trie, docket_number)
+        # Land Court, an appellate court, or None if the docket number is
+        # missing court code. Currently, because the initial
+        # check_proper_format check excludes docket numbers missing court
+        # codes (or at least what appears to be court codes), the None case is
+        # superfluous but won't be once the code is edited to address
+        # variations, which might not include court codes.
     else:
         if court_code in court_name_code_dict:
             return court_name_code_dict[court_code]
@@ -436,10 +662,12 @@ def identify_court_name(docket_number):
             # The docket number has incorrect (nonexistent) court code.
 
 def identify_case_type(docket_number):
-    case_type_code = find_case_type_code_re.search(docket_number).group()
+    match = find_case_type_code_re.search(docket_number)
+    case_type_code = match and match.group().upper()
     court_name = identify_court_name(docket_number)
     if not case_type_code:
-        if 'Appeals' in court_name or 'Supreme' in court_name:
+        if court_name and ('Appeals' in court_name or
+                           'Supreme' in court_name):
             return 'Appellate'
             # Without the docket number for the case in the lower court, we
             # cannot discern the case type. Not using the case-type code 'AD'
@@ -449,17 +677,14 @@ def identify_case_type(docket_number):
         # The docket number is missing case-type code. See above comment in
         # identify_court_name function re check_proper_format and variations.
     else:
-        if 'Probate' in court_name:
-            for key in probate_family_court_case_type_code_dict:
-                if key == case_type_code:
-                    return probate_family_court_case_type_code_dict[key]
+        if court_name and 'Probate' in court_name:
+            return probate_family_court_case_type_code_dict.get(case_type_code)
         # Case-type identification separates Probate and Family Court from other
         # courts because 'AD' refers to 'Adoption' in Probate and Family Court
         # while it refers to 'Appeal' in others.
         else:
-            for key in court_case_type_code_dict:
-                if key == case_type_code:
-                    return court_case_type_code_dict[key]
+            if case_type_code in court_case_type_code_dict:
+                return court_case_type_code_dict[case_type_code]
             else:
                 raise Exception
                 # The docket number has incorrect (nonexistent) case-type code.
@@ -484,18 +709,2368 @@ def identify_year(docket_number):
 def identify_sequence_number(docket_number):
     return find_sequence_number_re.search(docket_number).group()
 
-# DRAFT:
-# def get_case_info(docket_number):
-#    case_info = namedtuple('Case_Information', ['Court', 'Type',
-#                                                'Year', 'Number'])
-#    if check_proper_format_re.match(docket_number):
-#        try:
-#            a = identify_court_name(docket_number)
-#            b = identify_case_type(docket_number)
-#            c = identify_year(docket_number)
-#            d = identify_sequence_number(docket_number)
-#            print(case_info(a, b, c, d))
-#        except:
-#            print('Not proper format (1)')
-#    else:
-#        print('Not proper format (2)')
+# SINGLE-PASS PARSING
+#
+#   The identify_* functions above each run their own regex over the docket
+#   number (and identify_case_type runs identify_court_name again), so parsing
+#   one docket number takes five or more passes. docket_number_re instead
+#   matches every standard format at once. Each format is wrapped in its own
+#   named group, so match.lastgroup is the format tag, and the named groups
+#   inside it hold the court code, case-type code, year, and sequence number.
+#
+#   Format tags:
+#
+#       'trial'     Superior Court, District Court, BMC     1577CV00982
+#       'housing'   Housing Court                           15H84CV000436
+#       'land'      Land Court, except SBQ cases            07 TL 001026
+#       'sbq'       Land Court, SBQ cases                   15 SBQ 00025 09-001
+#       'probate'   Probate and Family Court                ES15A0064AD
+#       'appeals'   Appeals Court (incl. single justice)    2020-P-0874
+#       'sjc'       Supreme Judicial Court                  SJC-13103
+#       'sj'        SJC single-justice and bar-docket       BD-2021-034
+#
+#   NOTE: For SBQ cases, the sequence number is the one after the month; the
+#   plan number and month (and the probate case-group code) are matched but
+#   not returned.
+
+docket_number_pattern = (r'(?P<trial>(?P<trial_year>\d{2})'
+                         r'(?P<trial_court>\d{2})'
+                         r'(?P<trial_type>[A-Z]{2})'
+                         r'(?P<trial_number>\d{1,6}))|'
+                         # BMC, Dist. Ct., Super. Ct.
+                         r'(?P<housing>(?P<housing_year>\d{2})'
+                         r'(?P<housing_court>H\d{2})'
+                         r'(?P<housing_type>[A-Z]{2})'
+                         r'(?P<housing_number>\d{1,6}))|'
+                         # Housing Court
+                         r'(?P<sbq>(?P<sbq_year>\d{2})\s'
+                         r'(?P<sbq_type>SBQ)\s(?P<sbq_plan>\d{1,6})\s'
+                         r'(?P<sbq_month>\d{2})-'
+                         r'(?P<sbq_number>\d+))|'
+                         r'(?P<land>(?P<land_year>\d{2})\s'
+                         r'(?P<land_type>[A-Z]{2,4})\s'
+                         r'(?P<land_number>\d{1,6}))|'
+                         # Land Court
+                         r'(?P<probate>(?P<probate_court>[A-Z]{2})'
+                         r'(?P<probate_year>\d{2})'
+                         r'(?P<probate_group>[A-Z])'
+                         r'(?P<probate_number>\d+)'
+                         r'(?P<probate_type>[A-Z]{2}))|'
+                         # Probate and Family Court
+                         r'(?P<appeals>(?P<appeals_year>\d{4})-'
+                         r'(?P<appeals_court>[JP])-'
+                         r'(?P<appeals_number>\d+))|'
+                         # Appeals Court
+                         r'(?P<sjc>(?P<sjc_court>SJC)-'
+                         r'(?P<sjc_number>\d+))|'
+                         r'(?P<sj>(?P<sj_court>BD|SJ)-'
+                         r'(?P<sj_year>\d{4})-'
+                         r'(?P<sj_number>\d+))')
+                         # Supreme Judicial Court
+
+docket_number_re = deferred_regex('docket_number_re', docket_number_pattern,
+                                  re.I)
+
+# Group names of the court code, case-type code, year, and sequence number for
+# each format tag. None means the format has no such field.
+docket_number_format_groups = {
+    'trial'  : ('trial_court', 'trial_type', 'trial_year', 'trial_number'),
+    'housing': ('housing_court', 'housing_type', 'housing_year',
+                'housing_number'),
+    'sbq'    : (None, 'sbq_type', 'sbq_year', 'sbq_number'),
+    'land'   : (None, 'land_type', 'land_year', 'land_number'),
+    'probate': ('probate_court', 'probate_type', 'probate_year',
+                'probate_number'),
+    'appeals': ('appeals_court', None, 'appeals_year', 'appeals_number'),
+    'sjc'    : ('sjc_court', None, None, 'sjc_number'),
+    'sj'     : ('sj_court', None, 'sj_year', 'sj_number')
+}
+
+class CaseInfo:
+    # What get_case_info returns: the court, case type, year, sequence number,
+    # and format tag of a docket number. Only the codes are stored, interned,
+    # and Court and Type look the names up, so that millions of CaseInfo in
+    # memory share their strings. Iterates like the namedtuple (Court, Type,
+    # Year, Number, Format) it replaces.
+
+    __slots__ = ('Format', 'Court_Code', 'Type_Code', 'Year', 'Number')
+
+    _fields = ('Court', 'Type', 'Year', 'Number', 'Format')
+
+    def __init__(self, docket_format, court_code, case_type_code, year,
+                 number):
+        intern = sys.intern
+        self.Format = intern(docket_format)
+        self.Court_Code = court_code and intern(court_code)
+        self.Type_Code = case_type_code and intern(case_type_code)
+        self.Year = year and intern(year)
+        self.Number = number
+
+    @property
+    def Court(self):
+        if self.Format in ('land', 'sbq'):
+            return 'Land Court'
+        if self.Format in ('appeals', 'sjc', 'sj'):
+            return appellate_court_code_dict[self.Court_Code]
+        return court_name_code_dict[self.Court_Code]
+
+    @property
+    def Type(self):
+        if self.Format in ('land', 'sbq'):
+            return land_court_case_type_code_dict[self.Type_Code]
+        if self.Format == 'probate':
+            return probate_family_court_case_type_code_dict[self.Type_Code]
+        if self.Format in ('appeals', 'sjc', 'sj'):
+            return 'Appellate'
+        return court_case_type_code_dict[self.Type_Code]
+
+    def __iter__(self):
+        return iter((self.Court, self.Type, self.Year, self.Number,
+                     self.Format))
+
+    def __eq__(self, other):
+        if not isinstance(other, CaseInfo):
+            return NotImplemented
+        return (self.Format, self.Court_Code, self.Type_Code, self.Year,
+                self.Number) == (other.Format, other.Court_Code,
+                                 other.Type_Code, other.Year, other.Number)
+
+    def __hash__(self):
+        return hash((self.Format, self.Court_Code, self.Type_Code, self.Year,
+                     self.Number))
+
+    def __repr__(self):
+        return 'CaseInfo(' + ', '.join(
+            field + '=' + repr(value)
+            for field, value in zip(self._fields, self)) + ')'
+
+# STRUCTURED RESULTS
+#
+#   parse_docket_number never raises. It returns a Parse_Result, whose Error is
+#   a ParseError (ParseError.OK if the docket number parsed) and whose Span is
+#   the (start, end) of the part of the docket number that is wrong: the whole
+#   docket number for NO_MATCH, otherwise the offending code or year. The other
+#   fields hold as much as was parsed: codes as they appear (upper-cased), the
+#   4-digit year, and the court and case-type names.
+#
+#   Bad docket numbers cost no more than good ones, as no exception is raised
+#   and caught per docket number. get_case_info raises instead.
+
+class ParseError(enum.IntEnum):
+    OK = 0
+    NO_MATCH = 1
+    BAD_COURT_CODE = 2
+    BAD_CASE_TYPE = 3
+    BAD_CASE_GROUP = 4
+    GROUP_TYPE_MISMATCH = 5
+    FUTURE_YEAR = 6
+
+parse_error_message_dict = {
+    ParseError.OK                 : 'Parsed',
+    ParseError.NO_MATCH           : 'Not in a standard format',
+    ParseError.BAD_COURT_CODE     : 'Nonexistent court code',
+    ParseError.BAD_CASE_TYPE      : 'Nonexistent case-type code',
+    ParseError.BAD_CASE_GROUP     : 'Nonexistent case-group code',
+    ParseError.GROUP_TYPE_MISMATCH: 'Case group does not match case type',
+    ParseError.FUTURE_YEAR        : 'Case filed in a future year'
+}
+
+Parse_Result = namedtuple('Parse_Result', ['Error', 'Span', 'Format', 'Court',
+                                           'Type', 'Year', 'Number',
+                                           'Court_Name', 'Case_Type'])
+
+def parse_docket_number(docket_number, current_year=None):
+    # current_year is time.strftime('%Y'); pass it in to compute it only once
+    # for many docket numbers. profile_parse_docket_number (see
+    # INSTRUMENTATION) runs the same stages with timers between them.
+    match = docket_number_re.fullmatch(docket_number)
+    if not match:
+        return no_match_result(docket_number)
+    docket_format = match.lastgroup
+    court_code, court_name, case_type_dict = parse_court_code(match,
+                                                              docket_format)
+    case_type_code, case_type, error, span = parse_case_type_code(
+        match, docket_format, court_name, case_type_dict)
+    case_year, error, span = parse_case_year(match, docket_format,
+                                             current_year, error, span)
+    number = match.group(docket_number_format_groups[docket_format][3])
+    return Parse_Result(error, span, docket_format, court_code,
+                        case_type_code, case_year, number, court_name,
+                        case_type)
+
+def no_match_result(docket_number):
+    return Parse_Result(ParseError.NO_MATCH, (0, len(docket_number)), None,
+                        None, None, None, None, None, None)
+
+def parse_court_code(match, docket_format):
+    # Returns (court code, court name, case-type dict of the court), with
+    # court name None if the court code does not exist.
+    court_group = docket_number_format_groups[docket_format][0]
+    court_code = match.group(court_group).upper() if court_group else None
+    if docket_format == 'sbq' or docket_format == 'land':
+        return court_code, 'Land Court', land_court_case_type_code_dict
+    if docket_format == 'probate':
+        court_name = court_name_code_dict.get(court_code)
+        if court_name and 'Probate' not in court_name:
+            court_name = None
+            # 'ES' etc. are only probate and family court codes if they are
+            # in court_name_code_dict; 'SU' is also a case-type code, for
+            # instance.
+        return (court_code, court_name,
+                probate_family_court_case_type_code_dict)
+    if docket_format in ('appeals', 'sjc', 'sj'):
+        return court_code, appellate_court_code_dict.get(court_code), None
+    return (court_code, court_name_code_dict.get(court_code),
+            court_case_type_code_dict)
+
+def parse_case_type_code(match, docket_format, court_name, case_type_dict):
+    # Returns (case-type code, case type, error, span), checking the court
+    # name found by parse_court_code, the case-type code, and, in Probate and
+    # Family Court, the case-group code.
+    court_group, type_group = docket_number_format_groups[docket_format][:2]
+    case_type_code = match.group(type_group).upper() if type_group else None
+    if not court_name:
+        return (case_type_code, None, ParseError.BAD_COURT_CODE,
+                match.span(court_group))
+    if case_type_dict is None:
+        return case_type_code, 'Appellate', ParseError.OK, None
+        # See identify_case_type.
+    if case_type_code not in case_type_dict:
+        return (case_type_code, None, ParseError.BAD_CASE_TYPE,
+                match.span(type_group))
+    case_type = case_type_dict[case_type_code]
+    if docket_format == 'probate':
+        case_group_code = match.group('probate_group').upper()
+        if case_group_code not in probate_family_court_case_group_code_dict:
+            return (case_type_code, case_type, ParseError.BAD_CASE_GROUP,
+                    match.span('probate_group'))
+        if case_group_code not in \
+                probate_family_court_case_type_group_dict.get(case_type_code,
+                                                              ()):
+            return (case_type_code, case_type,
+                    ParseError.GROUP_TYPE_MISMATCH,
+                    match.span('probate_group'))
+    return case_type_code, case_type, ParseError.OK, None
+
+def parse_case_year(match, docket_format, current_year, error, span):
+    # Returns (4-digit year, error, span), with error FUTURE_YEAR if there was
+    # no error before and the case has not been filed yet.
+    year_group = docket_number_format_groups[docket_format][2]
+    case_year = match.group(year_group) if year_group else None
+    if case_year:
+        if current_year is None:
+            current_year = time.strftime('%Y')
+        if len(case_year) == 2:
+            case_year = current_year[:2] + case_year
+        if error == ParseError.OK and case_year > current_year:
+            return case_year, ParseError.FUTURE_YEAR, match.span(year_group)
+    return case_year, error, span
+
+def get_case_info(docket_number, cache=None):
+    if cache is None:
+        result = parse_docket_number(docket_number)
+    else:
+        result = cache.parse(docket_number)
+    error = result.Error
+    if error == ParseError.NO_MATCH:
+        return None
+        # Not in a standard format. See VARIATIONS above.
+    if error:
+        raise Exception(parse_error_message_dict[error])
+        # The docket number has an incorrect (nonexistent) court code,
+        # case-type code, or case-group code, or refers to a case that has not
+        # yet been filed.
+    return CaseInfo(result.Format, result.Court, result.Type, result.Year,
+                    result.Number)
+
+# BULK PARSING
+#
+#   parse_many parses any iterable of docket numbers and returns the results as
+#   columns, i.e., one list per field with one entry per docket number, instead
+#   of one CaseInfo per docket number. Codes are returned rather than
+#   names (look names up in the code dictionaries), and the year is the 4-digit
+#   year. Status is the ParseError; for docket numbers that did not parse, the
+#   other fields are None.
+#
+#   Without a cache, parse_many does not go through parse_docket_number: it
+#   matches and checks the codes in its own loop and appends the fields
+#   straight to the columns, so no Parse_Result is made per docket number. The
+#   statuses are the same. With a cache, or while instrumentation is enabled
+#   (see INSTRUMENTATION), each docket number goes through parse_docket_number.
+
+Case_Columns = namedtuple('Case_Columns', ['Court', 'Type', 'Year', 'Number',
+                                           'Format', 'Status'])
+
+def bulk_parse_formats():
+    # Format tag -> (group names, court codes, case-type codes), where group
+    # names are those of the court code, case-type code, year, sequence
+    # number, and case-group code. A field the format does not have is named
+    # by a group of another format, which never takes part in the match, so
+    # match.group(*names) always returns five values.
+    absent = {'trial': 'housing_court', 'housing': 'trial_court'}
+    court_code_dict = {
+        'trial'  : court_name_code_dict,
+        'housing': court_name_code_dict,
+        'probate': probate_family_court_code_set,
+        'appeals': appellate_court_code_dict,
+        'sjc'    : appellate_court_code_dict,
+        'sj'     : appellate_court_code_dict
+    }
+    case_type_code_dict = {
+        'trial'  : court_case_type_code_dict,
+        'housing': court_case_type_code_dict,
+        'land'   : land_court_case_type_code_dict,
+        'sbq'    : land_court_case_type_code_dict,
+        'probate': probate_family_court_case_type_code_dict
+    }
+    formats = {}
+    for docket_format, groups in docket_number_format_groups.items():
+        names = groups + ('probate_group',)
+        other = absent.get(docket_format, 'trial_court')
+        formats[docket_format] = (
+            tuple(name if name and (docket_format == 'probate' or
+                                    name != 'probate_group') else other
+                  for name in names),
+            court_code_dict.get(docket_format),
+            case_type_code_dict.get(docket_format))
+    return formats
+
+def parse_many(docket_numbers, cache=None):
+    courts, types, years, numbers, formats, statuses = [], [], [], [], [], []
+    add_court, add_type, add_year = courts.append, types.append, years.append
+    add_number, add_format = numbers.append, formats.append
+    add_status = statuses.append
+    if cache is not None or uninstrumented_function_dict:
+        if cache is None:
+            parse = functools.partial(parse_docket_number,
+                                      current_year=time.strftime('%Y'))
+        else:
+            parse = cache.parse
+        for docket_number in docket_numbers:
+            (error, _, docket_format, court_code, case_type_code, case_year,
+             number, _, _) = parse(docket_number)
+            add_status(error)
+            if not error:
+                add_court(court_code)
+                add_type(case_type_code)
+                add_year(case_year)
+                add_number(number)
+                add_format(docket_format)
+            else:
+                add_court(None)
+                add_type(None)
+                add_year(None)
+                add_number(None)
+                add_format(None)
+        return Case_Columns(courts, types, years, numbers, formats, statuses)
+    use_code_tables()
+    current_year = time.strftime('%Y')
+    century = current_year[:2]
+    fullmatch = docket_number_re.fullmatch
+    format_dict = bulk_parse_formats()
+    case_group_codes = probate_family_court_case_group_code_dict
+    case_type_groups = probate_family_court_case_type_group_dict
+    OK, NO_MATCH = ParseError.OK, ParseError.NO_MATCH
+    BAD_COURT_CODE, BAD_CASE_TYPE = (ParseError.BAD_COURT_CODE,
+                                     ParseError.BAD_CASE_TYPE)
+    BAD_CASE_GROUP, GROUP_TYPE_MISMATCH = (ParseError.BAD_CASE_GROUP,
+                                           ParseError.GROUP_TYPE_MISMATCH)
+    FUTURE_YEAR = ParseError.FUTURE_YEAR
+    for docket_number in docket_numbers:
+        match = fullmatch(docket_number)
+        if match is None:
+            error = NO_MATCH
+        else:
+            docket_format = match.lastgroup
+            names, court_codes, case_type_codes = format_dict[docket_format]
+            court_code, case_type_code, case_year, number, case_group_code = \
+                match.group(*names)
+            error = OK
+            if court_code is not None:
+                court_code = court_code.upper()
+                if court_code not in court_codes:
+                    error = BAD_COURT_CODE
+            if case_type_code is not None and not error:
+                case_type_code = case_type_code.upper()
+                if case_type_code not in case_type_codes:
+                    error = BAD_CASE_TYPE
+                elif case_group_code is not None:
+                    case_group_code = case_group_code.upper()
+                    if case_group_code not in case_group_codes:
+                        error = BAD_CASE_GROUP
+                    elif case_group_code not in \
+                            case_type_groups.get(case_type_code, ()):
+                        error = GROUP_TYPE_MISMATCH
+            if case_year is not None and not error:
+                if len(case_year) == 2:
+                    case_year = century + case_year
+                if case_year > current_year:
+                    error = FUTURE_YEAR
+            if not error:
+                add_status(OK)
+                add_court(court_code)
+                add_type(case_type_code)
+                add_year(case_year)
+                add_number(number)
+                add_format(docket_format)
+                continue
+        add_status(error)
+        add_court(None)
+        add_type(None)
+        add_year(None)
+        add_number(None)
+        add_format(None)
+    return Case_Columns(courts, types, years, numbers, formats, statuses)
+
+# PACKED DOCKET NUMBERS
+#
+#   pack_docket_number encodes a docket number in a standard format as one
+#   64-bit unsigned integer, and unpack_docket_number turns it back into the
+#   same docket number (upper-cased). Packed docket numbers take 8 bytes each
+#   in an array('Q') (see pack_many), against 200 or so for a string, and sort
+#   by format, court, case type, year, and sequence number.
+#
+#   Bits, most significant first (ordinals are 1-based, 0 meaning none):
+#
+#       All formats but SBQ         SBQ
+#
+#       3   format tag              3   format tag
+#       8   court-code ordinal      8   year - 1899
+#       6   case-type ordinal       20  plan number
+#       4   case-group ordinal      3   plan-number digits
+#       8   year - 1899             7   month
+#       31  sequence number         20  sequence number
+#       4   sequence-number digits  3   sequence-number digits
+#
+#   Ordinals are from court_code_list, case_type_code_list_dict, and
+#   case_group_code_list. The digit counts keep leading zeros. Docket numbers
+#   with codes not in the dictionaries, years outside 1900-2154, or numbers
+#   too long for their fields cannot be packed (ValueError). Nothing else is
+#   checked; see parse_docket_number.
+#
+#   0 is never a packed docket number, and pack_many uses it for docket
+#   numbers that cannot be packed.
+
+docket_format_list = tuple(docket_number_format_groups)
+
+def pack_digits(digits, value_bits, length_bits):
+    value = int(digits)
+    if value >> value_bits or len(digits) >> length_bits:
+        raise ValueError('Number too long to pack: ' + digits)
+    return value << length_bits | len(digits)
+
+def unpack_digits(packed, length_bits):
+    return str(packed >> length_bits).zfill(packed & ((1 << length_bits) - 1))
+
+def pack_docket_number(docket_number, current_year=None):
+    match = docket_number_re.fullmatch(docket_number)
+    if not match:
+        raise ValueError('Not in a standard format: ' + docket_number)
+    docket_format = match.lastgroup
+    court_group, type_group, year_group, number_group = \
+        docket_number_format_groups[docket_format]
+    packed = docket_format_list.index(docket_format)
+    year = 0
+    if year_group:
+        case_year = match.group(year_group)
+        if len(case_year) == 2:
+            case_year = (current_year or time.strftime('%Y'))[:2] + case_year
+        year = int(case_year) - 1899
+        if not 0 < year < 256:
+            raise ValueError('Year out of range: ' + case_year)
+    number = match.group(number_group)
+    if docket_format == 'sbq':
+        plan, month = match.group('sbq_plan', 'sbq_month')
+        return (((packed << 8 | year) << 23 | pack_digits(plan, 20, 3))
+                << 7 | int(month)) << 23 | pack_digits(number, 20, 3)
+    court = case_type = case_group = 0
+    try:
+        if court_group:
+            court = court_code_ordinal_dict[
+                match.group(court_group).upper()] + 1
+        if type_group:
+            case_type = case_type_code_ordinal_dict[docket_format][
+                match.group(type_group).upper()] + 1
+        if docket_format == 'probate':
+            case_group = case_group_code_list.index(
+                match.group('probate_group').upper()) + 1
+    except (KeyError, ValueError):
+        raise ValueError('Nonexistent code: ' + docket_number)
+    return ((((packed << 8 | court) << 6 | case_type) << 4 | case_group)
+            << 8 | year) << 35 | pack_digits(number, 31, 4)
+
+def unpack_fields(packed):
+    # Returns (format tag, court code, case-type code, case-group code, 4-digit
+    # year, sequence number) of a packed docket number. For SBQ docket numbers,
+    # case-group code is (plan number, month) instead.
+    docket_format = docket_format_list[packed >> 61]
+    if docket_format == 'sbq':
+        number = unpack_digits(packed & (1 << 23) - 1, 3)
+        month = str(packed >> 23 & 127).zfill(2)
+        plan = unpack_digits(packed >> 30 & (1 << 23) - 1, 3)
+        year = str((packed >> 53 & 255) + 1899)
+        return docket_format, None, 'SBQ', (plan, month), year, number
+    number = unpack_digits(packed & (1 << 35) - 1, 4)
+    year = packed >> 35 & 255
+    case_group = packed >> 43 & 15
+    case_type = packed >> 47 & 63
+    court = packed >> 53 & 255
+    return (docket_format,
+            court_code_list[court - 1] if court else None,
+            case_type_code_list_dict[docket_format][case_type - 1]
+            if case_type else None,
+            case_group_code_list[case_group - 1] if case_group else None,
+            str(year + 1899) if year else None,
+            number)
+
+def unpack_docket_number(packed):
+    docket_format, court_code, case_type_code, case_group_code, year, \
+        number = unpack_fields(packed)
+    if docket_format == 'sbq':
+        plan, month = case_group_code
+        return year[2:] + ' SBQ ' + plan + ' ' + month + '-' + number
+    if docket_format == 'land':
+        return year[2:] + ' ' + case_type_code + ' ' + number
+    if docket_format == 'probate':
+        return (court_code + year[2:] + case_group_code + number +
+                case_type_code)
+    if docket_format == 'appeals':
+        return year + '-' + court_code + '-' + number
+    if docket_format == 'sjc':
+        return 'SJC-' + number
+    if docket_format == 'sj':
+        return court_code + '-' + year + '-' + number
+    return year[2:] + court_code + case_type_code + number
+
+def unpack_case_info(packed):
+    docket_format, court_code, case_type_code, _, year, number = \
+        unpack_fields(packed)
+    return CaseInfo(docket_format, court_code, case_type_code, year, number)
+
+def pack_many(docket_numbers):
+    packed = array('Q')
+    add = packed.append
+    current_year = time.strftime('%Y')
+    for docket_number in docket_numbers:
+        try:
+            add(pack_docket_number(docket_number, current_year))
+        except ValueError:
+            add(0)
+    return packed
+
+# PARSE CACHE
+#
+#   The same docket numbers come up again and again (every filing in a case,
+#   every page of an interview), so get_case_info and parse_many can take a
+#   ParseCache, which keeps the results of parse_docket_number for up to
+#   maxsize docket numbers and evicts the least recently used.
+#
+#   A result depends on the current year (the future-year check, and the
+#   century of 2-digit years) and on the code tables, so the whole cache is
+#   cleared the first time it is used in a new year or after the code tables
+#   are reloaded. A ParseCache is not thread-safe; use one per thread.
+
+Cache_Info = namedtuple('Cache_Info', ['hits', 'misses', 'evictions',
+                                       'maxsize', 'currsize'])
+
+class ParseCache:
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+        self.current_year = None
+        self.expires = 0
+        # time.time() at which current_year ends
+        self.generation = None
+        # code_table_generation when the cache was last cleared
+
+    def parse(self, docket_number):
+        if time.time() >= self.expires or \
+                self.generation != code_table_generation:
+            self.start_year()
+        entries = self.entries
+        result = entries.get(docket_number)
+        if result is not None:
+            entries.move_to_end(docket_number)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = parse_docket_number(docket_number, self.current_year)
+        entries[docket_number] = result
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    def start_year(self):
+        self.entries.clear()
+        self.generation = code_table_generation
+        self.current_year = time.strftime('%Y')
+        self.expires = time.mktime((int(self.current_year) + 1, 1, 1,
+                                    0, 0, 0, 0, 0, -1))
+
+    def invalidate(self, docket_number=None):
+        # Drops one docket number, or every docket number if none is given.
+        if docket_number is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(docket_number, None)
+
+    def cache_info(self):
+        return Cache_Info(self.hits, self.misses, self.evictions,
+                          self.maxsize, len(self.entries))
+
+# NORMALIZATION
+#
+#   normalize_docket_number rewrites a docket number in any of the VARIATIONS
+#   listed at the top of this file into the standard format, with the sequence
+#   number zero-padded, or stripped of extra leading zeros, to the length
+#   masscourts.org expects (see sequence_number_length_dict). It returns None
+#   if it cannot.
+#
+#   Many variations leave out the court code or case-type code (e.g., 15-0982),
+#   so those can be passed in as court_code, case_type_code, and, for Probate
+#   and Family Court, case_group_code. Codes found in the docket number itself
+#   take precedence.
+#
+#   Docket numbers already in a standard format only go through
+#   docket_number_re; only variations go on to docket_number_variant_re and
+#   the guesswork in resolve_docket_number_variant.
+
+sequence_number_length_dict = {
+    'superior': 5,
+    'trial'   : 6,
+    # District Court and BMC
+    'housing' : 6,
+    'land'    : 6,
+    'probate' : 4,
+    'appeals' : 4,
+    'sj'      : 3
+}
+# SJC panel sequence numbers are not padded. Nor are SBQ sequence numbers,
+# which are left as they are.
+
+docket_number_variant_pattern = (
+    r'(?P<yycc_tt>(?P<a_year>\d{2})(?P<a_court>H?\d{2})[-\s]*'
+    r'(?P<a_type>[A-Z]{2})[-\s]*(?P<a_number>\d+))|'
+    # YYCC-TT-N+ / hCC
+    r'(?P<yy_tt>(?P<b_year>\d{2}|\d{4})[-\s]*(?P<b_type>[A-Z]{2,4})[-\s]*'
+    r'(?P<b_number>\d+))|'
+    # YY-TT-N+, YYTTN+, Land Court with other spacing
+    r'(?P<tt_yy_cc>(?P<c_type>[A-Z]{2})(?P<c_year>\d{2})(?P<c_court>H?\d{2})'
+    r'[-\s]+(?P<c_number>\d+))|'
+    # TTYYCC-N+ / hCC
+    r'(?P<cc_tt_yy>(?P<d_court>[A-Z]{2})(?P<d_type>[A-Z]{2})(?P<d_year>\d{2})'
+    r'[-\s]+(?P<d_group>[A-Z])?(?P<d_number>\d+)(?P=d_type)?)|'
+    # CCTTYY-(G)N+
+    r'(?P<xx_yy>(?P<e_code>[A-Z]{2})(?P<e_year>\d{2})[-\s]*'
+    r'(?P<e_group>[A-Z])?(?P<e_number>\d+)(?P<e_type>[A-Z]{2})?)|'
+    # TTYY-N+, CCYY-(G)N+
+    r'(?P<yy_hcc>(?P<f_year>\d{2})(?P<f_court>H\d{2})[-\s]+'
+    r'(?P<f_number>\d+))|'
+    # YYhCC-N+
+    r'(?P<yyyy>(?P<g_digits>\d{4})[-\s]+(?P<g_number>\d+))|'
+    # YYCC-N+, YYYY-N+
+    r'(?P<yy>(?P<h_year>\d{2})[-\s]+(?P<h_number>\d+))|'
+    # YY-N+, YY N+
+    r'(?P<appeals>(?P<i_year>\d{4})[-\s]*(?P<i_court>[JP])[-\s]*'
+    r'(?P<i_number>\d+))|'
+    r'(?P<sj>(?P<j_court>BD|SJ)[-\s]*(?P<j_year>\d{4})[-\s]*'
+    r'(?P<j_number>\d+))|'
+    r'(?P<sjc>SJC[-\s]*(?P<k_number>\d+))')
+    # Appellate courts, with other separators
+
+docket_number_variant_re = deferred_regex('docket_number_variant_re',
+                                          docket_number_variant_pattern, re.I)
+
+def pad_sequence_number(number, length_key):
+    # 00982 for 982 or 000982 in Superior Court, for instance.
+    return number.lstrip('0').zfill(sequence_number_length_dict[length_key])
+
+def format_docket_number(docket_format, court_code, case_type_code, case_year,
+                         number, case_group_code=None):
+    # Builds the standard docket number, or returns None if a field the format
+    # needs is missing or the result is not in the standard format (e.g., a
+    # sequence number too long for it). case_year may have 2 or 4 digits. The
+    # sequence number is padded or stripped of leading zeros to the length in
+    # sequence_number_length_dict. Not for SBQ cases.
+    if docket_format in ('appeals', 'sj'):
+        if not case_year or len(case_year) != 4:
+            return None
+        number = pad_sequence_number(number, docket_format)
+        if docket_format == 'appeals':
+            docket_number = case_year + '-' + court_code + '-' + number
+        else:
+            docket_number = court_code + '-' + case_year + '-' + number
+    elif docket_format == 'sjc':
+        docket_number = 'SJC-' + number
+    elif not case_year or not case_type_code:
+        return None
+    elif docket_format == 'land':
+        docket_number = (case_year[-2:] + ' ' + case_type_code + ' ' +
+                         pad_sequence_number(number, 'land'))
+    elif not court_code:
+        return None
+    elif docket_format == 'probate':
+        if not case_group_code:
+            return None
+        docket_number = (court_code + case_year[-2:] + case_group_code +
+                         pad_sequence_number(number, 'probate') +
+                         case_type_code)
+    else:
+        if court_code in superior_court_code_set:
+            number = pad_sequence_number(number, 'superior')
+        else:
+            number = pad_sequence_number(number, docket_format)
+        docket_number = case_year[-2:] + court_code + case_type_code + number
+    if not docket_number_re.fullmatch(docket_number):
+        return None
+    return docket_number
+
+def court_code_format(court_code):
+    # Format tag of the standard docket numbers with this court code.
+    if court_code[0] == 'H' and court_code[1:].isdigit():
+        return 'housing'
+        # Not 'HD' or 'HS', which are probate and family courts.
+    if court_code in probate_family_court_code_set:
+        return 'probate'
+    if court_code in appellate_court_code_dict:
+        return None
+    return 'trial'
+
+def split_docket_number_variant(match, court_code=None, case_type_code=None,
+                                case_group_code=None):
+    # Works out the fields of a docket_number_variant_re match, filling in
+    # missing ones from the arguments. Returns (format tag, court code,
+    # case-type code, year, sequence number, case-group code), with None for
+    # whatever could not be worked out; the format tag is None if the court
+    # code is missing.
+    variant = match.lastgroup
+    group = match.group
+    if variant == 'appeals':
+        return ('appeals', group('i_court').upper(), None, group('i_year'),
+                group('i_number'), None)
+    if variant == 'sj':
+        return ('sj', group('j_court').upper(), None, group('j_year'),
+                group('j_number'), None)
+    if variant == 'sjc':
+        return 'sjc', 'SJC', None, None, group('k_number'), None
+    year = None
+    group_code = case_group_code
+    if variant == 'yycc_tt':
+        year, court_code, case_type_code, number = group(
+            'a_year', 'a_court', 'a_type', 'a_number')
+    elif variant == 'yy_tt':
+        year, case_type_code, number = group('b_year', 'b_type', 'b_number')
+        if (not court_code and case_type_code in
+                land_court_case_type_code_dict):
+            return 'land', None, case_type_code.upper(), year, number, None
+    elif variant == 'tt_yy_cc':
+        case_type_code, year, court_code, number = group(
+            'c_type', 'c_year', 'c_court', 'c_number')
+    elif variant == 'cc_tt_yy':
+        court_code, case_type_code, year, number = group(
+            'd_court', 'd_type', 'd_year', 'd_number')
+        group_code = group('d_group') or group_code
+    elif variant == 'xx_yy':
+        code, year, number = group('e_code', 'e_year', 'e_number')
+        group_code = group('e_group') or group_code
+        case_type_code = group('e_type') or case_type_code
+        if group('e_group') or group('e_type'):
+            court_code = code
+        elif code in probate_family_court_code_set and (
+                code not in court_case_type_code_dict or
+                (court_code and court_code == code)):
+            court_code = code
+            # 'SU' is both Suffolk Probate and Family Court and Summary
+            # Process; it is read as Summary Process unless court_code says
+            # otherwise.
+        else:
+            case_type_code = code
+    elif variant == 'yy_hcc':
+        year, court_code, number = group('f_year', 'f_court', 'f_number')
+    elif variant == 'yyyy':
+        digits, number = group('g_digits', 'g_number')
+        if court_code == digits[2:] or not (
+                '1900' <= digits <= time.strftime('%Y')):
+            year, court_code = digits[:2], digits[2:]
+        else:
+            year = digits
+            # YYYY-N+ and YYCC-N+ look the same: 2015-982 could be Brockton
+            # District Court in 2020. Read as YYYY-N+ unless it cannot be a
+            # year or court_code says otherwise. cluster_docket_mentions tries
+            # both.
+    else:
+        year, number = group('h_year', 'h_number')
+    docket_format = None
+    if court_code:
+        court_code = court_code.upper()
+        docket_format = court_code_format(court_code)
+    return (docket_format, court_code,
+            case_type_code and case_type_code.upper(), year, number,
+            group_code and group_code.upper())
+
+def resolve_docket_number_variant(match, court_code=None, case_type_code=None,
+                                  case_group_code=None):
+    # Returns the standard docket number for a docket_number_variant_re match,
+    # or None.
+    docket_format, court_code, case_type_code, year, number, \
+        case_group_code = split_docket_number_variant(
+            match, court_code, case_type_code, case_group_code)
+    if not docket_format:
+        return None
+    return format_docket_number(docket_format, court_code, case_type_code,
+                                year, number, case_group_code)
+
+def normalize_docket_number(docket_number, court_code=None,
+                            case_type_code=None, case_group_code=None):
+    docket_number = docket_number.strip().upper()
+    match = docket_number_re.fullmatch(docket_number)
+    if match:
+        docket_format = match.lastgroup
+        if docket_format in ('sbq', 'sjc'):
+            return docket_number
+        court_group, type_group, year_group, number_group = \
+            docket_number_format_groups[docket_format]
+        number = match.group(number_group)
+        length = sequence_number_length_dict[docket_format]
+        if docket_format == 'trial' and \
+                match.group('trial_court') in superior_court_code_set:
+            length = sequence_number_length_dict['superior']
+        if len(number) == length:
+            return docket_number
+        # Otherwise padded or stripped to length by format_docket_number.
+        return format_docket_number(
+            docket_format, match.group(court_group) if court_group else None,
+            match.group(type_group) if type_group else None,
+            match.group(year_group), number,
+            match.group('probate_group') if docket_format == 'probate'
+            else None)
+    match = docket_number_variant_re.fullmatch(docket_number)
+    if not match:
+        return None
+    return resolve_docket_number_variant(
+        match, court_code and court_code.upper(),
+        case_type_code and case_type_code.upper(),
+        case_group_code and case_group_code.upper())
+
+# CLUSTERING
+#
+#   cluster_docket_mentions groups docket-number mentions that refer to the
+#   same case, however they are written. In SpineFrontier, for instance,
+#   1577-CV-00982, 15-CV-00982, 2015-982, and 1577CV00982 all refer to the
+#   same case.
+#
+#   mentions is an iterable of (document id, docket number as written) pairs,
+#   or of plain strings if there are no documents. Each mention is reduced to a
+#   key (court code, case-type code, 4-digit year, sequence number) and
+#   mentions are grouped by key with one dict, so the work is linear in the
+#   number of mentions. A mention missing its court or case-type code (e.g.,
+#   15-0982) has a partial key, with None for what is missing; it joins the
+#   cluster of the one complete key in the same document that agrees with it,
+#   and is unresolved if there is no such key or more than one. A mention that
+#   can be read two ways has a partial key for each: 2015-982 is case 982 of
+#   2015, or of 2020 in court 15, so it joins 2015CV000982 if that is in the
+#   same document.
+#
+#   Returns (clusters, unresolved): a list of Docket_Cluster in order of first
+#   mention, and the indexes of the mentions that could not be clustered,
+#   including those that normalize to a docket number that does not parse.
+#   Docket_Cluster.Mentions are indexes into mentions, in order.
+
+Docket_Cluster = namedtuple('Docket_Cluster', ['Docket_Number', 'Key',
+                                               'Mentions'])
+
+def docket_mention_key(text, current_year):
+    # Returns (standard docket number, key), or (None, partial keys) if the
+    # court or case-type code is missing, or (None, None). Codes a format does
+    # not have are '' in keys; codes that are missing are None.
+    docket_number = normalize_docket_number(text)
+    if docket_number:
+        result = parse_docket_number(docket_number, current_year)
+        if result.Error:
+            return None, None
+            # A nonexistent code or a future year; unresolved, not a cluster.
+        number = int(result.Number)
+        if result.Format == 'sbq':
+            number = docket_number
+            # SBQ sequence numbers start again for each plan and month.
+        return docket_number, (result.Court or '', result.Type or '',
+                               result.Year or '', number)
+    match = docket_number_variant_re.fullmatch(text.strip().upper())
+    if not match:
+        return None, None
+    readings = [split_docket_number_variant(match)]
+    if match.lastgroup == 'yyyy':
+        readings.append(split_docket_number_variant(
+            match, court_code=match.group('g_digits')[2:]))
+        # YYCC-N+ as well as YYYY-N+; see split_docket_number_variant.
+    keys = []
+    for _, court_code, case_type_code, year, number, _ in readings:
+        if year and len(year) == 2:
+            year = current_year[:2] + year
+        key = (court_code, case_type_code, year, int(number))
+        if key not in keys:
+            keys.append(key)
+    return None, tuple(keys)
+
+def cluster_docket_mentions(mentions):
+    current_year = time.strftime('%Y')
+    clusters = {}
+    contexts = {}
+    # Document id -> {partial key: complete key, or None if more than one}
+    partial_mentions = []
+    unresolved = []
+    for index, mention in enumerate(mentions):
+        if isinstance(mention, str):
+            document_id, text = None, mention
+        else:
+            document_id, text = mention
+        docket_number, key = docket_mention_key(text, current_year)
+        if key is None:
+            unresolved.append(index)
+        elif docket_number is None:
+            partial_mentions.append((index, document_id, key))
+        else:
+            cluster = clusters.get(key)
+            if cluster is None:
+                cluster = clusters[key] = Docket_Cluster(docket_number, key,
+                                                         [])
+            cluster.Mentions.append(index)
+            if document_id is not None:
+                context = contexts.setdefault(document_id, {})
+                court_code, case_type_code, year, number = key
+                for partial_key in ((None, case_type_code, year, number),
+                                    (court_code, None, year, number),
+                                    (None, None, year, number)):
+                    if context.setdefault(partial_key, key) != key:
+                        context[partial_key] = None
+    for index, document_id, partial_keys in partial_mentions:
+        context = contexts.get(document_id, {})
+        keys = {context[partial_key] for partial_key in partial_keys
+                if partial_key in context}
+        if len(keys) != 1 or None in keys:
+            unresolved.append(index)
+        else:
+            clusters[keys.pop()].Mentions.append(index)
+    if partial_mentions:
+        for cluster in clusters.values():
+            cluster.Mentions.sort()
+        unresolved.sort()
+    return list(clusters.values()), unresolved
+
+# DOCKET INDEX
+#
+#   DocketIndex keeps parsed docket numbers in a SQLite database, so that
+#   queries by court, case type, year, and sequence number do not have to
+#   re-parse raw docket numbers:
+#
+#       with DocketIndex('dockets.db') as index:
+#           index.add(open('dockets.txt'))
+#           index.query(court='H84', case_type='SU', year=2019,
+#                       number_range=(400, 900))
+#
+#   add parses docket numbers block_size at a time with parse_many and stores
+#   the ones that parse (add returns how many were new). Adding a docket number
+#   already in the index does nothing, so appending is always safe.
+#
+#   The table is clustered on (court, case_type, year, number), so a query
+#   that fixes a prefix of those is a range scan. Missing fields are stored as
+#   '' (Land Court has no court code, appellate courts no case-type code) or
+#   0 (SJC panel docket numbers have no year).
+
+class DocketIndex:
+
+    def __init__(self, path=':memory:'):
+        import sqlite3
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS docket ('
+            'court TEXT NOT NULL, case_type TEXT NOT NULL, '
+            'year INTEGER NOT NULL, number INTEGER NOT NULL, '
+            'docket_number TEXT NOT NULL, format TEXT NOT NULL, '
+            'PRIMARY KEY (court, case_type, year, number, docket_number)'
+            ') WITHOUT ROWID')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add(self, docket_numbers, block_size=10000, cache=None):
+        lines = (docket_number.strip() for docket_number in docket_numbers)
+        added = 0
+        while True:
+            block = list(itertools.islice(lines, block_size))
+            if not block:
+                return added
+            columns = parse_many(block, cache)
+            rows = [(court or '', case_type or '', int(year or 0),
+                     int(number), docket_number.upper(), docket_format)
+                    for docket_number, court, case_type, year, number,
+                    docket_format, status in zip(block, *columns)
+                    if not status]
+            with self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(
+                    'INSERT OR IGNORE INTO docket VALUES (?, ?, ?, ?, ?, ?)',
+                    rows)
+                added += self.connection.total_changes - before
+
+    def where(self, court, case_type, year, number_range, docket_format):
+        clauses, parameters = [], []
+        for column, value in (('court', court), ('case_type', case_type),
+                              ('year', year), ('format', docket_format)):
+            if value is not None:
+                clauses.append(column + ' = ?')
+                if column == 'year':
+                    value = int(value)
+                elif column != 'format':
+                    value = value.upper()
+                parameters.append(value)
+        if number_range is not None:
+            clauses.append('number BETWEEN ? AND ?')
+            parameters.extend(int(number) for number in number_range)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), \
+            parameters
+
+    def query(self, court=None, case_type=None, year=None, number_range=None,
+              docket_format=None):
+        # Yields the matching docket numbers in index order. Use court='' for
+        # Land Court. number_range is inclusive.
+        where, parameters = self.where(court, case_type, year, number_range,
+                                       docket_format)
+        for row in self.connection.execute(
+                'SELECT docket_number FROM docket' + where +
+                ' ORDER BY court, case_type, year, number', parameters):
+            yield row[0]
+
+    def count(self, court=None, case_type=None, year=None, number_range=None,
+              docket_format=None):
+        where, parameters = self.where(court, case_type, year, number_range,
+                                       docket_format)
+        return self.connection.execute('SELECT COUNT(*) FROM docket' + where,
+                                       parameters).fetchone()[0]
+
+# SEQUENCE COVERAGE
+#
+#   DocketCoverage records which sequence numbers have been seen for each
+#   court code, case-type code, and year (and, in Probate and Family Court,
+#   case-group code, which the docket number cannot be written without), and
+#   answers which have not:
+#
+#       coverage = DocketCoverage()
+#       coverage.add(open('dockets.txt'))
+#       coverage.gaps('H84', 'SU', '2019')          # [(1, 17), (23, 24), ...]
+#       coverage.next_unseen('H84', 'SU', '2019', 400)
+#       for docket_number in coverage.missing_docket_numbers('H84', 'SU',
+#                                                            '2019'):
+#           ...                                     # '19H84SU000001', ...
+#
+#   gaps and missing_docket_numbers cover start (default 1) up to stop, which
+#   defaults to just past the highest sequence number seen; both are lazy.
+#   SBQ docket numbers, whose sequence numbers restart with every plan, are
+#   skipped, as are docket numbers that do not parse.
+#
+#   Each key's sequence numbers are kept in a SequenceBitmap, laid out like a
+#   Roaring bitmap: the high 16 bits of each number pick a container, which
+#   holds the low 16 bits in whichever of these forms is smallest:
+#
+#       ArrayContainer          Sorted array('H'); 2 bytes a number, and at
+#                               most array_container_size numbers.
+#       BitmapContainer         65536 bits; 8 KB.
+#       RunContainer            Sorted runs of consecutive numbers, as
+#                               array('H')s of first and last numbers; 4 bytes
+#                               a run.
+#
+#   Sequence numbers are handed out in order, so most keys come down to a few
+#   runs, however many docket numbers were seen. add picks the smallest form
+#   for every container it changes; SequenceBitmap.add, for one number at a
+#   time, only turns a full ArrayContainer into a BitmapContainer, so call
+#   optimize after many of those.
+
+array_container_size = 4096
+# Past this, a BitmapContainer is smaller.
+
+Coverage_Key = namedtuple('Coverage_Key', ['Court', 'Type', 'Year', 'Group'])
+
+def bit_runs(bits, start=0):
+    # Yields (first, stop) of each run of 1 bits in the int bits, from bit
+    # start up.
+    bits = bits >> start << start
+    while bits:
+        low = bits & -bits
+        bits += low
+        # Clears the run and carries into the bit just past it.
+        stop = bits & -bits
+        bits ^= stop
+        yield low.bit_length() - 1, stop.bit_length() - 1
+
+class ArrayContainer:
+
+    def __init__(self, values=()):
+        self.values = array('H', values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        values = self.values
+        i = bisect.bisect_left(values, value)
+        return i < len(values) and values[i] == value
+
+    def add(self, value):
+        # Returns the container to use from now on. value must be new.
+        values = self.values
+        values.insert(bisect.bisect_left(values, value), value)
+        if len(values) > array_container_size:
+            return BitmapContainer(values)
+        return self
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def runs(self, start=0):
+        values = self.values
+        i = bisect.bisect_left(values, start)
+        if i == len(values):
+            return
+        first = stop = values[i]
+        for value in itertools.islice(values, i, None):
+            if value != stop:
+                yield first, stop
+                first = value
+            stop = value + 1
+        yield first, stop
+
+    def nbytes(self):
+        return 2 * len(self.values)
+
+class BitmapContainer:
+
+    def __init__(self, values=()):
+        self.bits = bytearray(8192)
+        self.count = 0
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        return self.bits[value >> 3] >> (value & 7) & 1
+
+    def add(self, value):
+        self.bits[value >> 3] |= 1 << (value & 7)
+        self.count += 1
+        return self
+
+    def __iter__(self):
+        for first, stop in self.runs():
+            yield from range(first, stop)
+
+    def runs(self, start=0):
+        return bit_runs(int.from_bytes(self.bits, 'little'), start)
+
+    def nbytes(self):
+        return len(self.bits)
+
+class RunContainer:
+
+    def __init__(self, values=()):
+        self.firsts = array('H')
+        self.lasts = array('H')
+        self.count = 0
+        for first, stop in ArrayContainer(values).runs():
+            self.firsts.append(first)
+            self.lasts.append(stop - 1)
+            self.count += stop - first
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, value):
+        i = bisect.bisect_right(self.firsts, value) - 1
+        return i >= 0 and self.lasts[i] >= value
+
+    def add(self, value):
+        firsts, lasts = self.firsts, self.lasts
+        i = bisect.bisect_right(firsts, value) - 1
+        joins_left = i >= 0 and lasts[i] == value - 1
+        joins_right = i + 1 < len(firsts) and firsts[i + 1] == value + 1
+        if joins_left and joins_right:
+            lasts[i] = lasts[i + 1]
+            del firsts[i + 1], lasts[i + 1]
+        elif joins_left:
+            lasts[i] = value
+        elif joins_right:
+            firsts[i + 1] = value
+        else:
+            firsts.insert(i + 1, value)
+            lasts.insert(i + 1, value)
+        self.count += 1
+        return self
+
+    def __iter__(self):
+        for first, stop in self.runs():
+            yield from range(first, stop)
+
+    def runs(self, start=0):
+        firsts, lasts = self.firsts, self.lasts
+        for i in range(bisect.bisect_left(lasts, start), len(firsts)):
+            yield max(firsts[i], start), lasts[i] + 1
+
+    def nbytes(self):
+        return 4 * len(self.firsts)
+
+def make_container(values):
+    # The smallest container of the sorted, distinct values.
+    run_count = sum(1 for _ in ArrayContainer(values).runs())
+    if 4 * run_count < min(2 * len(values), 8192):
+        return RunContainer(values)
+    if len(values) <= array_container_size:
+        return ArrayContainer(values)
+    return BitmapContainer(values)
+
+class SequenceBitmap:
+
+    def __init__(self, numbers=()):
+        self.keys = array('H')
+        # High 16 bits of the numbers in each container, in order
+        self.containers = []
+        if numbers:
+            self.update(numbers)
+
+    def __len__(self):
+        return sum(len(container) for container in self.containers)
+
+    def __contains__(self, number):
+        high = number >> 16
+        i = bisect.bisect_left(self.keys, high)
+        return i < len(self.keys) and self.keys[i] == high and \
+            number & 0xFFFF in self.containers[i]
+
+    def __iter__(self):
+        for high, container in zip(self.keys, self.containers):
+            base = high << 16
+            for value in container:
+                yield base + value
+
+    def add(self, number):
+        # Returns True if number is new. Numbers must be below 2 ** 32.
+        high, low = number >> 16, number & 0xFFFF
+        i = bisect.bisect_left(self.keys, high)
+        if i == len(self.keys) or self.keys[i] != high:
+            self.keys.insert(i, high)
+            self.containers.insert(i, ArrayContainer([low]))
+            return True
+        if low in self.containers[i]:
+            return False
+        self.containers[i] = self.containers[i].add(low)
+        return True
+
+    def update(self, numbers):
+        # Adds many numbers at once, and leaves each container it changes in
+        # its smallest form.
+        lows = {}
+        for number in numbers:
+            lows.setdefault(number >> 16, set()).add(number & 0xFFFF)
+        for high, values in lows.items():
+            i = bisect.bisect_left(self.keys, high)
+            if i < len(self.keys) and self.keys[i] == high:
+                values.update(self.containers[i])
+                self.containers[i] = make_container(sorted(values))
+            else:
+                self.keys.insert(i, high)
+                self.containers.insert(i, make_container(sorted(values)))
+
+    def optimize(self):
+        self.containers = [make_container(list(container))
+                           for container in self.containers]
+
+    def runs(self, start=0, stop=1 << 32):
+        # Yields (first, stop) of each run of consecutive numbers in the bitmap
+        # between start and stop.
+        pending = None
+        i = bisect.bisect_left(self.keys, start >> 16)
+        for high, container in zip(self.keys[i:], self.containers[i:]):
+            base = high << 16
+            for first, run_stop in container.runs(max(start - base, 0)):
+                first = max(first + base, start)
+                if first >= stop:
+                    break
+                run_stop = min(run_stop + base, stop)
+                if pending and pending[1] == first:
+                    pending = (pending[0], run_stop)
+                    # Runs can carry on into the next container.
+                else:
+                    if pending:
+                        yield pending
+                    pending = (first, run_stop)
+            else:
+                continue
+            break
+        if pending:
+            yield pending
+
+    def gaps(self, start=0, stop=1 << 32):
+        # Yields (first, stop) of each run of numbers between start and stop
+        # that are not in the bitmap.
+        for first, run_stop in self.runs(start, stop):
+            if first > start:
+                yield start, first
+            start = run_stop
+        if start < stop:
+            yield start, stop
+
+    def count(self, start=0, stop=1 << 32):
+        return sum(run_stop - first for first, run_stop in
+                   self.runs(start, stop))
+
+    def next_unseen(self, number):
+        for first, run_stop in self.runs(number):
+            return run_stop if first == number else number
+        return number
+
+    def max(self):
+        # The highest number in the bitmap, or None if it is empty.
+        if not self.containers:
+            return None
+        return (self.keys[-1] << 16) + max(self.containers[-1].runs())[1] - 1
+
+    def nbytes(self):
+        return 2 * len(self.keys) + sum(container.nbytes()
+                                        for container in self.containers)
+
+class DocketCoverage:
+
+    def __init__(self):
+        self.bitmaps = {}
+        # Coverage_Key -> SequenceBitmap
+
+    def __len__(self):
+        return sum(len(bitmap) for bitmap in self.bitmaps.values())
+
+    def keys(self):
+        return self.bitmaps.keys()
+
+    def add(self, docket_numbers, block_size=10000, cache=None):
+        # Returns how many docket numbers parsed and were added (whether or
+        # not they had been seen before).
+        added = 0
+        docket_numbers = iter(docket_numbers)
+        while True:
+            block = [docket_number.strip() for docket_number in
+                     itertools.islice(docket_numbers, block_size)]
+            if not block:
+                return added
+            numbers = {}
+            columns = parse_many(block, cache)
+            for docket_number, court_code, case_type_code, case_year, \
+                    number, docket_format in zip(block, *columns[:5]):
+                if docket_format is None or docket_format == 'sbq':
+                    continue
+                number = int(number)
+                if number >> 32:
+                    continue
+                key = Coverage_Key(
+                    court_code, case_type_code, case_year,
+                    docket_number[4].upper() if docket_format == 'probate'
+                    else None)
+                numbers.setdefault(key, []).append(number)
+                added += 1
+            for key, key_numbers in numbers.items():
+                bitmap = self.bitmaps.get(key)
+                if bitmap is None:
+                    bitmap = self.bitmaps[key] = SequenceBitmap()
+                bitmap.update(key_numbers)
+
+    def key(self, court_code, case_type_code, case_year, case_group_code=None):
+        if case_year and len(str(case_year)) == 2:
+            case_year = time.strftime('%Y')[:2] + str(case_year)
+        return Coverage_Key(court_code and court_code.upper(),
+                            case_type_code and case_type_code.upper(),
+                            case_year and str(case_year),
+                            case_group_code and case_group_code.upper())
+
+    def bitmap(self, court_code, case_type_code, case_year,
+               case_group_code=None):
+        # The SequenceBitmap of the key, empty if nothing was seen for it.
+        return self.bitmaps.get(self.key(court_code, case_type_code,
+                                         case_year, case_group_code),
+                                SequenceBitmap())
+
+    def count(self, court_code, case_type_code, case_year,
+              case_group_code=None, start=0, stop=1 << 32):
+        return self.bitmap(court_code, case_type_code, case_year,
+                           case_group_code).count(start, stop)
+
+    def gaps(self, court_code, case_type_code, case_year,
+             case_group_code=None, start=1, stop=None):
+        bitmap = self.bitmap(court_code, case_type_code, case_year,
+                             case_group_code)
+        if stop is None:
+            stop = (bitmap.max() or 0) + 1
+        return bitmap.gaps(start, stop)
+
+    def next_unseen(self, court_code, case_type_code, case_year,
+                    case_group_code=None, start=1):
+        return self.bitmap(court_code, case_type_code, case_year,
+                           case_group_code).next_unseen(start)
+
+    def missing_docket_numbers(self, court_code, case_type_code, case_year,
+                               case_group_code=None, start=1, stop=None):
+        key = self.key(court_code, case_type_code, case_year, case_group_code)
+        if key.Court is None:
+            docket_format = 'land'
+        elif key.Court == 'SJC':
+            docket_format = 'sjc'
+        elif key.Court in ('P', 'J'):
+            docket_format = 'appeals'
+        elif key.Court in appellate_court_code_dict:
+            docket_format = 'sj'
+        else:
+            docket_format = court_code_format(key.Court)
+        for first, gap_stop in self.gaps(*key, start=start, stop=stop):
+            for number in range(first, gap_stop):
+                yield format_docket_number(docket_format, key.Court, key.Type,
+                                           key.Year, str(number), key.Group)
+
+    def nbytes(self):
+        # Bytes of sequence-number data, leaving out Python object overhead.
+        return sum(bitmap.nbytes() for bitmap in self.bitmaps.values())
+
+# EXTRACTION
+#
+#   find_docket_numbers finds the docket numbers in free text, such as the OCR
+#   text of a court-stamped civil-action cover sheet. It scans the text once,
+#   with one regex that has every standard format and variation in it, and
+#   yields a Docket_Match for each docket number found:
+#
+#       start, end      Span of the docket number in the text
+#       text            The docket number as it appears in the text
+#       docket_number   normalize_docket_number(text, ...), or None
+#       info            CaseInfo for docket_number, or None if it
+#                       could not be normalized or has nonexistent codes
+#
+#   text can also be an iterable of strings, e.g., a file opened in text mode,
+#   in which case spans are offsets into the concatenated strings. A docket
+#   number split between two strings is still found, as long as it is no
+#   longer than max_docket_number_length.
+#
+#   With variations=False, only docket numbers in a standard format are found.
+#   Variations without separators or codes, e.g., '20 0735', also match dates,
+#   phone numbers, and the like; check docket_number or info before using
+#   them.
+
+Docket_Match = namedtuple('Docket_Match', ['start', 'end', 'text',
+                                           'docket_number', 'info'])
+
+max_docket_number_length = 64
+
+docket_number_search_re = deferred_regex(
+    'docket_number_search_re',
+    r'(?<![A-Z0-9])(?:' + docket_number_pattern + r')(?![A-Z0-9])', re.I)
+
+docket_number_variant_search_re = deferred_regex(
+    'docket_number_variant_search_re',
+    r'(?<![A-Z0-9])(?:\d{2}\s+SBQ\s+\d{1,6}\s+\d{2}-\d+|' +
+    docket_number_variant_pattern + r')(?![A-Z0-9])', re.I)
+
+def find_docket_numbers(text, variations=True, court_code=None,
+                        case_type_code=None, case_group_code=None):
+    if variations:
+        search_re = docket_number_variant_search_re
+    else:
+        search_re = docket_number_search_re
+    if isinstance(text, str):
+        chunks = [text]
+    else:
+        chunks = text
+    current_year = time.strftime('%Y')
+    normalize = normalize_docket_number
+    buffer = ''
+    base = 0
+    # Offset of buffer[0] in the whole text.
+    pos = 0
+    # Where to start scanning buffer. Once the buffer has been trimmed,
+    # buffer[0] is kept only for the lookbehind, and pos is 1.
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            limit = len(buffer)
+            # End of the text: every match is complete.
+        else:
+            buffer += chunk
+            limit = len(buffer) - max_docket_number_length
+            # A match ending after limit might continue in the next chunk.
+            if limit <= pos:
+                continue
+        cut = limit
+        for match in search_re.finditer(buffer, pos):
+            if match.end() > limit:
+                cut = match.start()
+                break
+            match_text = match.group()
+            docket_number = normalize(match_text, court_code, case_type_code,
+                                      case_group_code)
+            info = None
+            if docket_number:
+                result = parse_docket_number(docket_number, current_year)
+                if not result.Error:
+                    info = CaseInfo(result.Format, result.Court, result.Type,
+                                    result.Year, result.Number)
+            yield Docket_Match(base + match.start(), base + match.end(),
+                               match_text, docket_number, info)
+        if cut > pos:
+            buffer = buffer[cut - 1:]
+            base += cut - 1
+            pos = 1
+
+# OCR CORRECTION
+#
+#   correct_docket_number proposes valid docket numbers for a docket number
+#   that OCR has garbled, e.g., 1S77CV0O982, 15H8ACV000436, or 1577C00982,
+#   ranked by cost:
+#
+#       0.5     Substituting a character OCR often confuses it with (O and 0,
+#               S and 5, ... ; see ocr_confusion_pairs)
+#       1       Substituting any other character, in a court, case-type, or
+#               case-group code only
+#       1       Dropping an extra character (ocr_edit_cost), or putting back
+#               a missing one: anywhere in a code, but in a year or sequence
+#               number only where there are too few digits, as a digit missing
+#               from a sequence number cannot be told from a shorter one
+#
+#   Separators are ignored. Each format is tried as a template of slots
+#   (correction_template_dict), and the input is split between the slots every
+#   way the slot lengths allow. Digit slots take digits and the letters
+#   confused with them. Code slots are looked up in code_correction_index,
+#   which maps every string within max_code_cost of a valid code to the codes
+#   it could be, so the cost of a lookup does not depend on the number of
+#   codes. The indexes are built on first use.
+#
+#   Returns a list of Docket_Correction, best first, of at most limit standard
+#   docket numbers that parse without errors, cost at most max_cost, and are
+#   from 1900 on (1577C00982 is not case 982 of 1577 in the Appeals Court).
+
+Docket_Correction = namedtuple('Docket_Correction', ['Docket_Number', 'Cost'])
+
+ocr_confusion_pairs = [('0', 'O'), ('0', 'Q'), ('0', 'D'), ('1', 'I'),
+                       ('1', 'L'), ('1', 'T'), ('2', 'Z'), ('4', 'A'),
+                       ('5', 'S'), ('6', 'G'), ('7', 'T'), ('8', 'B'),
+                       ('9', 'G')]
+
+ocr_confusion_dict = {}
+for digit, letter in ocr_confusion_pairs:
+    ocr_confusion_dict.setdefault(digit, set()).add(letter)
+    ocr_confusion_dict.setdefault(letter, set()).add(digit)
+
+max_code_cost = 1.5
+
+ocr_edit_cost = 1
+
+correction_template_dict = {
+    'trial'  : (('digits', 'year', 2, 2), ('code', 'court', 'trial_court'),
+                ('code', 'type', 'trial_type'), ('digits', 'number', 1, 6)),
+    'housing': (('digits', 'year', 2, 2), ('code', 'court', 'housing_court'),
+                ('code', 'type', 'trial_type'), ('digits', 'number', 1, 6)),
+    'land'   : (('digits', 'year', 2, 2), ('code', 'type', 'land_type'),
+                ('digits', 'number', 1, 6)),
+    'probate': (('code', 'court', 'probate_court'), ('digits', 'year', 2, 2),
+                ('code', 'group', 'probate_group'),
+                ('digits', 'number', 1, 6), ('code', 'type', 'probate_type')),
+    'appeals': (('digits', 'year', 4, 4), ('code', 'court', 'appeals_court'),
+                ('digits', 'number', 1, 6)),
+    'sjc'    : (('code', 'court', 'sjc_court'), ('digits', 'number', 1, 6)),
+    'sj'     : (('code', 'court', 'sj_court'), ('digits', 'year', 4, 4),
+                ('digits', 'number', 1, 6))
+}
+# SBQ docket numbers are not corrected.
+
+def correction_codes(code_set):
+    if code_set == 'trial_court':
+        return [code for code in court_name_code_dict if code.isdigit()]
+    if code_set == 'housing_court':
+        return [code for code in court_name_code_dict
+                if court_code_format(code) == 'housing']
+    if code_set == 'probate_court':
+        return sorted(probate_family_court_code_set)
+    if code_set == 'trial_type':
+        return list(court_case_type_code_dict)
+    if code_set == 'land_type':
+        return [code for code in land_court_case_type_code_dict
+                if code != 'SBQ']
+    if code_set == 'probate_type':
+        return list(probate_family_court_case_type_code_dict)
+    if code_set == 'probate_group':
+        return list(probate_family_court_case_group_code_dict)
+    if code_set == 'appeals_court':
+        return ['J', 'P']
+    if code_set == 'sjc_court':
+        return ['SJC']
+    return ['BD', 'SJ']
+
+def code_correction_index(code_set):
+    # Returns (index, lengths), where index maps each string within
+    # max_code_cost of a code in code_set to a list of (code, cost), and
+    # lengths are the lengths of those strings, shortest first.
+    index = code_correction_indexes.get(code_set)
+    if index is not None:
+        return index
+    best = {}
+    for code in correction_codes(code_set):
+        variants = {code: 0}
+        for i, char in enumerate(code):
+            for variant, cost in list(variants.items()):
+                for other in ocr_confusion_dict.get(char, ()):
+                    key = variant[:i] + other + variant[i + 1:]
+                    if cost + 0.5 < variants.get(key, max_code_cost + 1):
+                        variants[key] = cost + 0.5
+        substituted = list(variants.items())
+        for variant, cost in substituted:
+            if cost + 1 > max_code_cost:
+                continue
+            for i, char in enumerate(code):
+                if variant[i] != char:
+                    continue
+                alphabet = ('0123456789' if char.isdigit() else
+                            'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+                for other in alphabet:
+                    key = variant[:i] + other + variant[i + 1:]
+                    if cost + 1 < variants.get(key, max_code_cost + 1):
+                        variants[key] = cost + 1
+        for variant, cost in substituted:
+            cost += ocr_edit_cost
+            if cost > max_code_cost:
+                continue
+            keys = [variant[:i] + variant[i + 1:] for i in range(len(variant))]
+            # A character dropped
+            keys += [variant[:i] + other + variant[i:]
+                     for i in range(len(variant) + 1)
+                     for other in '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ']
+            # A character added
+            for key in keys:
+                if cost < variants.get(key, max_code_cost + 1):
+                    variants[key] = cost
+        for variant, cost in variants.items():
+            if cost < best.get((variant, code), max_code_cost + 1):
+                best[variant, code] = cost
+    index = {}
+    for (variant, code), cost in best.items():
+        index.setdefault(variant, []).append((code, cost))
+    index = (MappingProxyType(index), sorted({len(variant)
+                                              for variant in index}))
+    code_correction_indexes[code_set] = index
+    return index
+
+def correct_digits(text, max_cost, min_length, max_length):
+    # Yields (digits, cost) for each way of reading text as min_length to
+    # max_length digits. Characters are only dropped if they cannot be read as
+    # digits or there are too many, and digits only put back if there are too
+    # few.
+    if text:
+        char = text[0]
+        if char.isdigit():
+            options = [(char, 0)]
+        else:
+            options = [(other, 0.5) for other in
+                       ocr_confusion_dict.get(char, ()) if other.isdigit()]
+        if max_length > 0:
+            for digit, cost in options:
+                if cost > max_cost:
+                    continue
+                for rest, rest_cost in correct_digits(
+                        text[1:], max_cost - cost, min_length - 1,
+                        max_length - 1):
+                    yield digit + rest, cost + rest_cost
+        if ocr_edit_cost <= max_cost and (not options or
+                                          len(text) > max_length):
+            for rest, rest_cost in correct_digits(
+                    text[1:], max_cost - ocr_edit_cost, min_length,
+                    max_length):
+                yield rest, ocr_edit_cost + rest_cost
+            # text[0] is extra.
+    elif min_length <= 0:
+        yield '', 0
+    if len(text) < min_length and ocr_edit_cost <= max_cost:
+        for digit in '0123456789':
+            for rest, rest_cost in correct_digits(
+                    text, max_cost - ocr_edit_cost, min_length - 1,
+                    max_length - 1):
+                yield digit + rest, ocr_edit_cost + rest_cost
+        # A digit is missing before text[0].
+
+def correct_slots(slots, text, max_cost, fields):
+    # Yields (fields, cost) for each way of filling slots with all of text.
+    if not slots:
+        if not text:
+            yield dict(fields), 0
+        return
+    slot = slots[0]
+    if slot[0] == 'digits':
+        edits = int(max_cost // ocr_edit_cost)
+        lengths = range(max(slot[2] - edits, 0), slot[3] + edits + 1)
+    else:
+        index, lengths = code_correction_index(slot[2])
+    for length in lengths:
+        if length > len(text):
+            break
+        part = text[:length]
+        if slot[0] == 'digits':
+            options = correct_digits(part, max_cost, slot[2], slot[3])
+        else:
+            options = index.get(part, ())
+        for value, cost in options:
+            if cost > max_cost:
+                continue
+            fields[slot[1]] = value
+            for result, rest_cost in correct_slots(
+                    slots[1:], text[length:], max_cost - cost, fields):
+                yield result, cost + rest_cost
+        fields.pop(slot[1], None)
+
+def correct_docket_number(docket_number, max_cost=2, limit=5):
+    text = re.sub(r'[-\s_.]', '', docket_number.upper())
+    current_year = time.strftime('%Y')
+    budget = 0
+    while True:
+        budget = min(budget, max_cost)
+        best = {}
+        for docket_format, slots in correction_template_dict.items():
+            for fields, cost in correct_slots(slots, text, budget, {}):
+                candidate = format_docket_number(
+                    docket_format, fields.get('court'), fields.get('type'),
+                    fields.get('year'), fields['number'], fields.get('group'))
+                if not candidate or cost >= best.get(candidate, budget + 1):
+                    continue
+                year = fields.get('year')
+                if year and len(year) == 4 and year < '1900':
+                    continue
+                if parse_docket_number(candidate, current_year).Error:
+                    continue
+                best[candidate] = cost
+        if len(best) >= limit or budget >= max_cost:
+            break
+        budget += 0.5
+        # Candidates not found yet cost more than budget, so once there are
+        # limit of them the rest cannot make the list. A small budget is much
+        # faster to search than max_cost.
+    return [Docket_Correction(candidate, float(cost)) for candidate, cost in
+            sorted(best.items(), key=lambda item: (item[1], item[0]))[:limit]]
+
+# INCREMENTAL PARSING
+#
+#   For parsing a docket number as it is typed. DocketPrefix() is the empty
+#   docket number, and feed(chars) returns the DocketPrefix for the docket
+#   number typed so far plus chars, working from this one's state rather than
+#   from the start:
+#
+#       prefix = DocketPrefix().feed('15H8')
+#       prefix.formats              {'housing'}
+#       prefix.court_names          {'Northeast Housing Court', ...}
+#       prefix.candidates('court')  {'H83', 'H84', 'H85'}
+#       prefix.fields               {'year': '15'}
+#
+#   A DocketPrefix never changes, so keep one per keystroke to undo a
+#   backspace. It is alive while the text could still become a docket number,
+#   and complete when the text is one, in a standard format and with codes
+#   from the code dictionaries.
+#
+#   Each format is a template of tokens (prefix_template_dict), like the
+#   patterns in check_proper_format_re but with the codes spelled out:
+#
+#       ('digits', field, min, max)     max None for no limit
+#       ('code', field, {prefix: codes that start with it}, codes)
+#       ('literal', text)
+#
+#   The state is the list of paths still alive, one for each way of reading
+#   the text so far: (format tag, token index, text of that token, completed
+#   fields). There are only ever a few, so each keystroke takes microseconds.
+
+def code_token(field, codes):
+    prefixes = {}
+    for code in codes:
+        for i in range(1, len(code) + 1):
+            prefixes.setdefault(code[:i], set()).add(code)
+    return ('code', field, {prefix: frozenset(codes_with_prefix)
+                            for prefix, codes_with_prefix in
+                            prefixes.items()}, frozenset(codes))
+
+def prefix_templates():
+    global prefix_template_dict
+    if prefix_template_dict is not None:
+        return prefix_template_dict
+    year = ('digits', 'year', 2, 2)
+    full_year = ('digits', 'year', 4, 4)
+    trial_type = code_token('type', [code for code in court_case_type_code_dict
+                                     if len(code) == 2])
+    prefix_template_dict = {
+        'trial'  : (year, code_token('court', correction_codes('trial_court')),
+                    trial_type, ('digits', 'number', 1, 6)),
+        'housing': (year,
+                    code_token('court', correction_codes('housing_court')),
+                    trial_type, ('digits', 'number', 1, 6)),
+        'sbq'    : (year, ('literal', ' SBQ '), ('digits', 'plan', 1, 6),
+                    ('literal', ' '), ('digits', 'month', 2, 2),
+                    ('literal', '-'), ('digits', 'number', 1, None)),
+        'land'   : (year, ('literal', ' '),
+                    code_token('type', correction_codes('land_type')),
+                    ('literal', ' '), ('digits', 'number', 1, 6)),
+        'probate': (code_token('court', correction_codes('probate_court')),
+                    year,
+                    code_token('group', correction_codes('probate_group')),
+                    ('digits', 'number', 1, None),
+                    code_token('type', correction_codes('probate_type'))),
+        'appeals': (full_year, ('literal', '-'),
+                    code_token('court', ['J', 'P']), ('literal', '-'),
+                    ('digits', 'number', 1, None)),
+        'sjc'    : (code_token('court', ['SJC']), ('literal', '-'),
+                    ('digits', 'number', 1, None)),
+        'sj'     : (code_token('court', ['BD', 'SJ']), ('literal', '-'),
+                    full_year, ('literal', '-'),
+                    ('digits', 'number', 1, None))
+    }
+    return prefix_template_dict
+
+def token_accepts(token, text):
+    # Whether text could be the start of token.
+    kind = token[0]
+    if kind == 'digits':
+        return text[-1].isdigit() and (token[3] is None or
+                                       len(text) <= token[3])
+    if kind == 'code':
+        return text in token[2]
+    return token[1].startswith(text)
+
+def token_complete(token, text):
+    kind = token[0]
+    if kind == 'digits':
+        return len(text) >= token[2]
+    if kind == 'code':
+        return text in token[3]
+    return text == token[1]
+
+class DocketPrefix:
+
+    __slots__ = ('text', 'paths')
+
+    def __init__(self, text='', paths=None):
+        self.text = text
+        if paths is None:
+            paths = tuple((docket_format, 0, '', ())
+                          for docket_format in prefix_templates())
+        self.paths = paths
+
+    def feed(self, chars):
+        templates = prefix_templates()
+        paths = self.paths
+        for char in chars.upper():
+            next_paths = []
+            for docket_format, i, text, fields in paths:
+                tokens = templates[docket_format]
+                token = tokens[i]
+                if token_accepts(token, text + char):
+                    next_paths.append((docket_format, i, text + char, fields))
+                if text and i + 1 < len(tokens) and \
+                        token_complete(token, text) and \
+                        token_accepts(tokens[i + 1], char):
+                    if token[0] != 'literal':
+                        fields += ((token[1], text),)
+                    next_paths.append((docket_format, i + 1, char, fields))
+            paths = tuple(next_paths)
+        return DocketPrefix(self.text + chars, paths)
+
+    @property
+    def alive(self):
+        return bool(self.paths)
+
+    @property
+    def complete(self):
+        templates = prefix_templates()
+        for docket_format, i, text, fields in self.paths:
+            tokens = templates[docket_format]
+            if i == len(tokens) - 1 and token_complete(tokens[i], text):
+                return True
+        return False
+
+    @property
+    def formats(self):
+        return {path[0] for path in self.paths}
+
+    @property
+    def fields(self):
+        # The completed fields that are the same on every path.
+        fields = None
+        for path in self.paths:
+            if fields is None:
+                fields = dict(path[3])
+            else:
+                fields = {name: value for name, value in path[3]
+                          if fields.get(name) == value}
+        return fields or {}
+
+    def candidates(self, field):
+        # The codes that field could still be, for 'court', 'type', or
+        # 'group'. Formats without that field add nothing.
+        templates = prefix_templates()
+        codes = set()
+        for docket_format, i, text, fields in self.paths:
+            for name, value in fields:
+                if name == field:
+                    codes.add(value)
+                    break
+            else:
+                tokens = templates[docket_format]
+                for j, token in enumerate(tokens):
+                    if token[0] == 'code' and token[1] == field:
+                        if j == i:
+                            codes |= token[2].get(text, frozenset())
+                        elif j > i:
+                            codes |= token[3]
+        return codes
+
+    @property
+    def court_names(self):
+        names = set()
+        for docket_format in self.formats:
+            if docket_format in ('land', 'sbq'):
+                names.add('Land Court')
+        for court_code in self.candidates('court'):
+            names.add(court_name_code_dict.get(court_code) or
+                      appellate_court_code_dict[court_code])
+        return names
+
+    def __repr__(self):
+        return 'DocketPrefix(' + repr(self.text) + ')'
+
+# INSTRUMENTATION
+#
+#   enable_instrumentation swaps parse_docket_number and the identify_*
+#   functions for versions that time each stage of parsing and count what they
+#   see in a ParseStats, and disable_instrumentation swaps the originals back.
+#   While it is disabled nothing is timed or counted, so it costs nothing.
+#   Everything here that parses (get_case_info, parse_many, ParseCache, the
+#   command line, ...) looks the functions up when it is called, so it is
+#   instrumented too; code that did `from SDT import parse_docket_number` is
+#   not. ParseCache hits do not parse, so they are not counted.
+#
+#   A ParseStats holds:
+#
+#       stage_ns, stage_calls   Time spent in, and calls to, each stage in
+#                               parse_stage_list: matching the format, then
+#                               the court code, case-type (and case-group)
+#                               code, year, and sequence number. The
+#                               identify_* functions are stages too, and as
+#                               identify_case_type calls identify_court_name,
+#                               its time includes a 'court' stage.
+#       format_counts           Format tag (None if no format matched) ->
+#                               docket numbers parsed.
+#       error_counts            ParseError -> docket numbers parsed.
+#       latency_buckets         Count of parses by time taken, one per bound
+#                               in parse_latency_bound_list plus one for the
+#                               rest.
+#       parses, latency_ns      Parses, and their total time.
+#       slowest                 The slowest_size slowest docket numbers, as
+#                               (ns, docket number), for finding pathological
+#                               inputs.
+#
+#   snapshot returns all of it as a dict, json_snapshot as JSON, and
+#   prometheus_text in the Prometheus text exposition format. A sink, if
+#   given, is called with the ParseStats every flush_every parses and when
+#   instrumentation is disabled; e.g., to log a snapshot every million parses:
+#
+#       enable_instrumentation(ParseStats(
+#           lambda stats: log.write(stats.json_snapshot() + '\n'), 1000000))
+#
+#   Counts are updated without a lock, so they can come out slightly low when
+#   several threads parse at once.
+
+parse_stage_list = ['format', 'court', 'type', 'year', 'sequence']
+
+parse_latency_bound_list = [500, 1000, 2000, 4000, 8000, 16000, 32000,
+                            64000, 128000, 256000]
+# Nanoseconds
+
+parse_stats = None
+# The ParseStats last passed to enable_instrumentation
+
+uninstrumented_function_dict = {}
+# Function name -> original function, while instrumentation is enabled
+
+class ParseStats:
+
+    def __init__(self, sink=None, flush_every=100000, slowest_size=10):
+        self.sink = sink
+        self.flush_every = flush_every
+        self.slowest_size = slowest_size
+        self.reset()
+
+    def reset(self):
+        self.stage_ns = [0] * len(parse_stage_list)
+        self.stage_calls = [0] * len(parse_stage_list)
+        self.format_counts = {}
+        self.error_counts = {}
+        self.latency_buckets = [0] * (len(parse_latency_bound_list) + 1)
+        self.parses = self.latency_ns = 0
+        self.slowest = []
+        # A heap, fastest first
+        self.slowest_floor = 0
+        self.flush_at = self.flush_every if self.sink else float('inf')
+
+    def add_parse(self, docket_number, elapsed, docket_format, error):
+        format_counts, error_counts = self.format_counts, self.error_counts
+        format_counts[docket_format] = format_counts.get(docket_format, 0) + 1
+        error_counts[error] = error_counts.get(error, 0) + 1
+        self.latency_buckets[bisect.bisect_left(parse_latency_bound_list,
+                                                elapsed)] += 1
+        self.latency_ns += elapsed
+        self.parses += 1
+        if elapsed > self.slowest_floor:
+            if len(self.slowest) < self.slowest_size:
+                heapq.heappush(self.slowest, (elapsed, docket_number))
+            else:
+                heapq.heappushpop(self.slowest, (elapsed, docket_number))
+            if len(self.slowest) == self.slowest_size:
+                self.slowest_floor = self.slowest[0][0]
+        if self.parses >= self.flush_at:
+            self.flush()
+
+    def flush(self):
+        if self.sink:
+            self.flush_at = self.parses + self.flush_every
+            self.sink(self)
+
+    def snapshot(self):
+        return {
+            'parses'    : self.parses,
+            'latency_ns': self.latency_ns,
+            'stages'    : {stage: {'calls': self.stage_calls[i],
+                                   'ns': self.stage_ns[i]}
+                           for i, stage in enumerate(parse_stage_list)},
+            'formats'   : {docket_format or 'none': count for
+                           docket_format, count in self.format_counts.items()},
+            'errors'    : {error.name.lower(): count for
+                           error, count in sorted(self.error_counts.items())},
+            'latency_buckets': [
+                {'le_ns': bound, 'count': count} for bound, count in
+                zip(parse_latency_bound_list + [None], self.latency_buckets)],
+            'slowest'   : [{'ns': elapsed, 'docket_number': docket_number}
+                           for elapsed, docket_number in
+                           sorted(self.slowest, reverse=True)]
+        }
+
+    def json_snapshot(self):
+        import json
+        return json.dumps(self.snapshot())
+
+    def prometheus_text(self, prefix='sdt_parse'):
+        lines = []
+        def metric(name, kind, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for labels, value in samples:
+                lines.append('%s_%s%s %s' % (prefix, name, labels, value))
+        metric('stage_seconds_total', 'counter',
+               'Time spent in each parsing stage.',
+               [('{stage="%s"}' % stage, self.stage_ns[i] / 1e9)
+                for i, stage in enumerate(parse_stage_list)])
+        metric('stage_calls_total', 'counter', 'Calls to each parsing stage.',
+               [('{stage="%s"}' % stage, self.stage_calls[i])
+                for i, stage in enumerate(parse_stage_list)])
+        metric('format_total', 'counter', 'Docket numbers parsed by format.',
+               [('{format="%s"}' % (docket_format or 'none'), count) for
+                docket_format, count in sorted(self.format_counts.items(),
+                                               key=lambda item: item[0] or '')])
+        metric('errors_total', 'counter', 'Docket numbers parsed by status.',
+               [('{error="%s"}' % error.name.lower(),
+                 self.error_counts.get(error, 0)) for error in ParseError])
+        samples = []
+        count = 0
+        for bound, bucket in zip(parse_latency_bound_list + [None],
+                                 self.latency_buckets):
+            count += bucket
+            samples.append(('_bucket{le="%s"}' % (
+                '+Inf' if bound is None else repr(bound / 1e9)), count))
+        samples.append(('_sum', self.latency_ns / 1e9))
+        samples.append(('_count', self.parses))
+        metric('duration_seconds', 'histogram', 'Time to parse a docket '
+               'number.', samples)
+        # Histogram sample names are suffixed rather than labelled, so the
+        # suffixes ride in the labels slot.
+        return '\n'.join(lines) + '\n'
+
+def profile_parse_docket_number(docket_number, current_year=None):
+    # parse_docket_number, with a timer around each stage.
+    stats = parse_stats
+    stage_ns = stats.stage_ns
+    clock = time.perf_counter_ns
+    start = clock()
+    match = docket_number_re.fullmatch(docket_number)
+    if not match:
+        now = clock()
+        stage_ns[0] += now - start
+        stats.stage_calls[0] += 1
+        stats.add_parse(docket_number, now - start, None, ParseError.NO_MATCH)
+        return no_match_result(docket_number)
+    docket_format = match.lastgroup
+    time_1 = clock()
+    court_code, court_name, case_type_dict = parse_court_code(match,
+                                                              docket_format)
+    time_2 = clock()
+    case_type_code, case_type, error, span = parse_case_type_code(
+        match, docket_format, court_name, case_type_dict)
+    time_3 = clock()
+    case_year, error, span = parse_case_year(match, docket_format,
+                                             current_year, error, span)
+    time_4 = clock()
+    number = match.group(docket_number_format_groups[docket_format][3])
+    now = clock()
+    stage_ns[0] += time_1 - start
+    stage_ns[1] += time_2 - time_1
+    stage_ns[2] += time_3 - time_2
+    stage_ns[3] += time_4 - time_3
+    stage_ns[4] += now - time_4
+    stage_calls = stats.stage_calls
+    for i in range(5):
+        stage_calls[i] += 1
+    stats.add_parse(docket_number, now - start, docket_format, error)
+    return Parse_Result(error, span, docket_format, court_code,
+                        case_type_code, case_year, number, court_name,
+                        case_type)
+
+def timed_stage(stage, function):
+    i = parse_stage_list.index(stage)
+    @functools.wraps(function)
+    def timed(docket_number):
+        stats = parse_stats
+        start = time.perf_counter_ns()
+        try:
+            return function(docket_number)
+        finally:
+            stats.stage_ns[i] += time.perf_counter_ns() - start
+            stats.stage_calls[i] += 1
+    return timed
+
+def enable_instrumentation(stats=None):
+    # Returns the ParseStats now being added to. Enabling again only switches
+    # to the new ParseStats.
+    global parse_stats
+    stats = stats or ParseStats()
+    if uninstrumented_function_dict:
+        parse_stats = stats
+        return stats
+    functions = {
+        'parse_docket_number'     : profile_parse_docket_number,
+        'identify_court_name'     : timed_stage('court', identify_court_name),
+        'identify_case_type'      : timed_stage('type', identify_case_type),
+        'identify_year'           : timed_stage('year', identify_year),
+        'identify_sequence_number': timed_stage('sequence',
+                                                identify_sequence_number)
+    }
+    uninstrumented_function_dict.update(
+        (name, globals()[name]) for name in functions)
+    parse_stats = stats
+    globals().update(functions)
+    return stats
+
+def disable_instrumentation():
+    # Returns the ParseStats that was being added to, after flushing it, or
+    # None if instrumentation was not enabled. parse_stats is left as it is,
+    # for any parse still running in another thread.
+    if not uninstrumented_function_dict:
+        return None
+    globals().update(uninstrumented_function_dict)
+    uninstrumented_function_dict.clear()
+    parse_stats.flush()
+    return parse_stats
+
+# COMMAND LINE
+#
+#   python -m SDT [FILE] [--output-format jsonl|csv] [--fields ...]
+#                 [--stats json|prometheus]
+#
+#   Reads one docket number per line from FILE (or stdin if FILE is omitted or
+#   '-'), gzipped or not, and writes one JSON object or CSV row per docket
+#   number to stdout. Input is read and parsed block_size lines at a time with
+#   parse_many, and each block is written and flushed before the next is read,
+#   so memory use does not grow with the size of the input.
+
+output_field_list = ['Docket'] + list(Case_Columns._fields)
+
+def open_docket_file(path=None):
+    if path is None or path == '-':
+        raw = sys.stdin.buffer
+    else:
+        raw = open(path, 'rb')
+    if raw.peek(2)[:2] == b'\x1f\x8b':
+        import gzip
+        raw = gzip.GzipFile(fileobj=raw)
+        # Gzip is detected by its magic number rather than the file name so
+        # that gzipped stdin works too.
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+
+def parse_blocks(lines, block_size=10000):
+    # Yields (docket numbers, Case_Columns) for each block of block_size
+    # non-blank lines.
+    docket_numbers = (line.strip() for line in lines if not line.isspace())
+    while True:
+        block = list(itertools.islice(docket_numbers, block_size))
+        if not block:
+            return
+        yield block, parse_many(block)
+
+def write_blocks(blocks, out, output_format='jsonl', fields=None,
+                 header=True):
+    fields = fields or output_field_list
+    for field in fields:
+        if field not in output_field_list:
+            raise ValueError('Unknown field: ' + field)
+    import csv
+    import json
+    if output_format == 'csv':
+        writer = csv.writer(out)
+        if header:
+            writer.writerow(fields)
+    elif output_format != 'jsonl':
+        raise ValueError('Unknown output format: ' + output_format)
+    dumps = json.dumps
+    for block, columns in blocks:
+        rows = zip(*[block if field == 'Docket' else
+                     [status.name.lower() for status in columns.Status]
+                     if field == 'Status' else getattr(columns, field)
+                     for field in fields])
+        if output_format == 'csv':
+            writer.writerows(rows)
+        else:
+            out.write(''.join([dumps(dict(zip(fields, row))) + '\n'
+                               for row in rows]))
+        out.flush()
+
+# PARALLEL PARSING
+#
+#   parse_file_parallel splits an uncompressed input file into byte ranges of
+#   about chunk_size bytes, each ending just after a newline, and parses them
+#   in a pool of worker processes. Each worker reads and parses its own range
+#   and writes its output to a file in a temporary directory; the files are
+#   copied to out in file order and deleted, so the output is the same as with
+#   a single process. Output is about ten times the size of the input, so
+#   nothing but file names goes between processes, and at most 2 * workers
+#   ranges are in flight at once, which keeps memory and temporary disk space
+#   bounded.
+#
+#   Gzipped input and stdin cannot be split into byte ranges, and go through
+#   parse_blocks instead.
+
+default_chunk_size = 4 * 1024 * 1024
+
+def file_chunks(path, chunk_size):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+def parse_file_chunk(path, start, end, output_path, output_format='jsonl',
+                     fields=None):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8',
+                             errors='replace')
+    # Split into lines exactly as open_docket_file's lines are, on '\n',
+    # '\r', and '\r\n' only, so the output matches a single process.
+    with open(output_path, 'w', encoding='utf-8', newline='') as out:
+        write_blocks(parse_blocks(lines), out, output_format, fields,
+                     header=False)
+    return output_path
+
+def parse_file_parallel(path, out, output_format='jsonl', fields=None,
+                        workers=None, chunk_size=default_chunk_size):
+    fields = fields or output_field_list
+    workers = workers or os.cpu_count()
+    import csv
+    import shutil
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    if output_format == 'csv':
+        csv.writer(out).writerow(fields)
+    def copy_output(future):
+        with open(future.result(), encoding='utf-8', newline='') as f:
+            shutil.copyfileobj(f, out)
+        os.remove(f.name)
+        out.flush()
+    with tempfile.TemporaryDirectory(prefix='sdt-') as directory, \
+            ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for start, end in file_chunks(path, chunk_size):
+            if len(pending) >= 2 * workers:
+                copy_output(pending.popleft())
+            pending.append(executor.submit(
+                parse_file_chunk, path, start, end,
+                os.path.join(directory, '%d.out' % start), output_format,
+                fields))
+        while pending:
+            copy_output(pending.popleft())
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m SDT',
+        description='Parse Massachusetts court docket numbers, one per line.')
+    parser.add_argument('file', nargs='?', default='-',
+                        help="input file, optionally gzipped ('-' for stdin)")
+    parser.add_argument('--output-format', choices=['jsonl', 'csv'],
+                        default='jsonl')
+    parser.add_argument('--fields', default=','.join(output_field_list),
+                        help='comma-separated output fields, from: ' +
+                             ', '.join(output_field_list))
+    parser.add_argument('--block-size', type=int, default=10000,
+                        help='lines parsed and written at a time')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes (0 for one per CPU); more '
+                             'than 1 needs an uncompressed input file')
+    parser.add_argument('--chunk-size', type=int, default=default_chunk_size,
+                        help='bytes of input per worker task')
+    parser.add_argument('--stats', choices=['json', 'prometheus'],
+                        help='write parsing statistics to stderr at the end '
+                             '(see INSTRUMENTATION)')
+    args = parser.parse_args(argv)
+    fields = args.fields.split(',')
+    for field in fields:
+        if field not in output_field_list:
+            parser.error('unknown field: ' + field)
+    if args.workers != 1:
+        if args.stats:
+            parser.error('--stats needs --workers 1')
+        if args.file == '-':
+            parser.error('--workers needs an input file, not stdin')
+        with open(args.file, 'rb') as f:
+            if f.read(2) == b'\x1f\x8b':
+                parser.error('--workers needs an uncompressed input file')
+        parse_file_parallel(args.file, sys.stdout, args.output_format,
+                            fields, args.workers or None, args.chunk_size)
+        return
+    if args.stats:
+        stats = enable_instrumentation()
+    with open_docket_file(args.file) as lines:
+        write_blocks(parse_blocks(lines, args.block_size), sys.stdout,
+                     args.output_format, fields)
+    if args.stats:
+        disable_instrumentation()
+        sys.stderr.write(stats.json_snapshot() + '\n'
+                         if args.stats == 'json' else stats.prometheus_text())
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+# Benchmarks for SDT.py
+#
+#   corpus.py   Seeded generator of valid, variant, and malformed docket
+#               numbers in every standard format.
+#   run.py      Times the SDT functions on a generated corpus and writes the
+#               results as JSON, optionally comparing them with an earlier run.
+#
+#   python -m benchmarks.run --size 20000 --output results.json
+#   python -m benchmarks.run --compare results.json
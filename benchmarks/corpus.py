@@ -0,0 +1,167 @@
+# Synthetic corpus generator
+#
+#   generate_corpus(size, seed) returns a list of Corpus_Record, one per docket
+#   number, built from the code dictionaries in SDT.py. The same size and seed
+#   always give the same corpus.
+#
+#       kind            'valid', 'variant', or 'malformed'
+#       format          SDT format tag of the docket number it was made from
+#       docket_number   The docket number
+#
+#   'variant' docket numbers are valid docket numbers rewritten into one of
+#   the VARIATIONS in SDT.py; 'malformed' ones have a nonexistent code, a
+#   future year, or characters mangled the way OCR mangles them.
+
+import random
+import time
+from collections import namedtuple
+
+import SDT
+
+Corpus_Record = namedtuple('Corpus_Record', ['kind', 'format',
+                                             'docket_number'])
+
+format_list = ['trial', 'housing', 'land', 'sbq', 'probate', 'appeals',
+               'sjc', 'sj']
+
+kind_weight_dict = {
+    'valid'    : 0.6,
+    'variant'  : 0.25,
+    'malformed': 0.15
+}
+
+trial_court_code_list = sorted(
+    code for code in SDT.court_name_code_dict if code.isdigit())
+housing_court_code_list = sorted(
+    code for code in SDT.court_name_code_dict
+    if code[0] == 'H' and code[1:].isdigit())
+probate_court_code_list = sorted(SDT.probate_family_court_code_set)
+trial_case_type_code_list = sorted(
+    code for code in SDT.court_case_type_code_dict
+    if code not in SDT.land_court_case_type_code_dict)
+land_case_type_code_list = sorted(
+    code for code in SDT.land_court_case_type_code_dict if code != 'SBQ')
+probate_case_type_code_list = sorted(
+    SDT.probate_family_court_case_type_code_dict)
+
+def random_number(rng, length):
+    return str(rng.randint(1, 10 ** length - 1)).zfill(length)
+
+def make_valid(rng, docket_format, current_year):
+    # Returns (docket number, fields) where fields is a dict of the codes used,
+    # for make_variant.
+    year = rng.randint(2000, current_year)
+    yy = str(year)[2:]
+    if docket_format == 'trial':
+        court = rng.choice(trial_court_code_list)
+        case_type = rng.choice(trial_case_type_code_list)
+        length = 5 if court in SDT.superior_court_code_set else 6
+        number = random_number(rng, length)
+        return yy + court + case_type + number, locals()
+    if docket_format == 'housing':
+        court = rng.choice(housing_court_code_list)
+        case_type = rng.choice(trial_case_type_code_list)
+        number = random_number(rng, 6)
+        return yy + court + case_type + number, locals()
+    if docket_format == 'land':
+        case_type = rng.choice(land_case_type_code_list)
+        number = random_number(rng, 6)
+        return yy + ' ' + case_type + ' ' + number, locals()
+    if docket_format == 'sbq':
+        number = random_number(rng, 3)
+        return (yy + ' SBQ ' + random_number(rng, 5) + ' ' +
+                str(rng.randint(1, 12)).zfill(2) + '-' + number), locals()
+    if docket_format == 'probate':
+        court = rng.choice(probate_court_code_list)
+        case_type = rng.choice(probate_case_type_code_list)
+        group = rng.choice(
+            SDT.probate_family_court_case_type_group_dict[case_type])
+        number = random_number(rng, 4)
+        return court + yy + group + number + case_type, locals()
+    if docket_format == 'appeals':
+        number = random_number(rng, 4)
+        return str(year) + '-' + rng.choice('PJ') + '-' + number, locals()
+    if docket_format == 'sjc':
+        number = random_number(rng, 5)
+        return 'SJC-' + number, locals()
+    number = random_number(rng, 3)
+    return rng.choice(['BD', 'SJ']) + '-' + str(year) + '-' + number, locals()
+
+def make_variant(rng, docket_format, fields):
+    number = fields['number'].lstrip('0') or '0'
+    if rng.random() < 0.5:
+        number = fields['number']
+    yy, year = fields['yy'], str(fields['year'])
+    if docket_format in ('trial', 'housing'):
+        court, case_type = fields['court'], fields['case_type']
+        return rng.choice([yy + court + '-' + case_type + '-' + number,
+                           yy + court + '-' + number,
+                           yy + '-' + case_type + '-' + number,
+                           yy + case_type + number,
+                           case_type + yy + court + '-' + number,
+                           case_type + yy + '-' + number,
+                           year + '-' + number,
+                           yy + '-' + number,
+                           yy + ' ' + number])
+    if docket_format == 'probate':
+        court, case_type = fields['court'], fields['case_type']
+        group = fields['group']
+        return rng.choice([court + yy + '-' + group + number,
+                           court + yy + '-' + number,
+                           court + case_type + yy + '-' + group + number,
+                           court + yy + group + number + case_type])
+    if docket_format == 'land':
+        return rng.choice([yy + '-' + fields['case_type'] + '-' + number,
+                           yy + fields['case_type'] + number])
+    if docket_format == 'appeals':
+        return year + ' P ' + number
+    if docket_format == 'sj':
+        return 'BD ' + year + ' ' + number
+    return None
+    # No variations of SJC panel or SBQ docket numbers.
+
+ocr_confusion_dict = {
+    '0': 'O', '1': 'I', '5': 'S', '8': 'B', '2': 'Z', '6': 'G',
+    'O': '0', 'I': '1', 'S': '5', 'B': '8', 'Z': '2', 'G': '6'
+}
+
+def make_malformed(rng, docket_format, docket_number, current_year):
+    choice = rng.randrange(4)
+    if choice == 0 and docket_format == 'trial':
+        return docket_number[:2] + '99' + docket_number[4:]
+        # Nonexistent court code
+    if choice == 1 and docket_format in ('trial', 'housing'):
+        return str(current_year + 1)[2:] + docket_number[2:]
+        # Future year
+    if choice == 2:
+        chars = list(docket_number)
+        positions = [i for i, char in enumerate(chars)
+                     if char in ocr_confusion_dict]
+        if positions:
+            i = rng.choice(positions)
+            chars[i] = ocr_confusion_dict[chars[i]]
+            return ''.join(chars)
+    return docket_number[:rng.randrange(1, len(docket_number))]
+    # Truncated
+
+def generate_corpus(size, seed=0, formats=None, kind_weights=None):
+    rng = random.Random(seed)
+    formats = formats or format_list
+    kind_weights = kind_weights or kind_weight_dict
+    kinds = list(kind_weights)
+    weights = [kind_weights[kind] for kind in kinds]
+    current_year = int(time.strftime('%Y'))
+    corpus = []
+    while len(corpus) < size:
+        docket_format = rng.choice(formats)
+        kind = rng.choices(kinds, weights)[0]
+        docket_number, fields = make_valid(rng, docket_format, current_year)
+        if kind == 'variant':
+            docket_number = make_variant(rng, docket_format, fields)
+            if docket_number is None:
+                continue
+        elif kind == 'malformed':
+            docket_number = make_malformed(rng, docket_format, docket_number,
+                                           current_year)
+        corpus.append(Corpus_Record(kind, docket_format, docket_number))
+    return corpus
@@ -0,0 +1,235 @@
+# Benchmark harness
+#
+#   python -m benchmarks.run [--size N] [--seed S] [--repeat R]
+#                            [--output FILE] [--compare FILE]
+#
+#   Generates a corpus with benchmarks.corpus, then times each function in
+#   benchmark_function_dict on each group of docket numbers in it: one group
+#   per format tag ('format:trial', ...) and one per kind ('kind:valid',
+#   ...). Each timing is the best of --repeat runs; peak memory is measured in
+#   a separate run under tracemalloc, since tracemalloc slows things down.
+#
+#   Startup costs are timed too, in the group 'startup': 'import' is importing
+#   SDT in a fresh interpreter, which loads no code tables and compiles no
+#   regexes; 'first_parse' is the first parse_docket_number after that import,
+#   which does both (see CODE TABLES in SDT.py); and 'reload_code_tables' is
+#   reloading the code tables in this interpreter.
+#
+#   Results are written as JSON (results_format_version says which layout):
+#
+#       {"version": 1, "python": ..., "platform": ..., "timestamp": ...,
+#        "size": ..., "seed": ..., "repeat": ...,
+#        "results": [{"function": ..., "group": ..., "records": ...,
+#                     "ns_per_record": ..., "records_per_sec": ...,
+#                     "peak_bytes": ...}, ...]}
+#
+#   With --compare, each result is compared with the same function and group
+#   in an earlier results file, and the exit status is 1 if any is slower by
+#   more than --threshold (default 10%).
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import SDT
+from benchmarks.corpus import generate_corpus
+
+results_format_version = 1
+
+benchmark_function_dict = {
+    'get_case_info'           : SDT.get_case_info,
+    'identify_court_name'     : SDT.identify_court_name,
+    'identify_case_type'      : SDT.identify_case_type,
+    'identify_year'           : SDT.identify_year,
+    'identify_sequence_number': SDT.identify_sequence_number,
+    'normalize_docket_number' : SDT.normalize_docket_number,
+    'parse_many'              : SDT.parse_many
+}
+# parse_many is called once per group, on the whole group; the others once per
+# docket number.
+
+startup_function_list = ['import', 'first_parse', 'reload_code_tables']
+
+startup_script_dict = {
+    'import'     : ('import time; start = time.perf_counter_ns(); import SDT; '
+                    'print(time.perf_counter_ns() - start)',
+                    'import tracemalloc, SDT; '
+                    'print(tracemalloc.get_traced_memory()[1])'),
+    'first_parse': ('import time, SDT; start = time.perf_counter_ns(); '
+                    'SDT.parse_docket_number("1577CV00982"); '
+                    'print(time.perf_counter_ns() - start)',
+                    'import tracemalloc, SDT; '
+                    'SDT.parse_docket_number("1577CV00982"); '
+                    'print(tracemalloc.get_traced_memory()[1])')
+}
+# Function name -> (timing script, memory script). The memory script is run
+# with -X tracemalloc, so the peak includes interpreter startup.
+
+def run_once(function_name, docket_numbers):
+    function = benchmark_function_dict[function_name]
+    if function_name == 'parse_many':
+        start = time.perf_counter_ns()
+        function(docket_numbers)
+        return time.perf_counter_ns() - start
+    start = time.perf_counter_ns()
+    for docket_number in docket_numbers:
+        try:
+            function(docket_number)
+        except Exception:
+            pass
+            # The identify_* functions raise on bad codes and future years.
+    return time.perf_counter_ns() - start
+
+def measure(function_name, docket_numbers, repeat):
+    elapsed = min(run_once(function_name, docket_numbers)
+                  for _ in range(repeat))
+    tracemalloc.start()
+    run_once(function_name, docket_numbers)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    records = len(docket_numbers)
+    return {
+        'records'        : records,
+        'ns_per_record'  : elapsed / records,
+        'records_per_sec': records * 1e9 / elapsed if elapsed else None,
+        'peak_bytes'     : peak_bytes
+    }
+
+def run_import(script, *options):
+    return int(subprocess.run(
+        [sys.executable] + list(options) + ['-c', script],
+        cwd=os.path.dirname(os.path.abspath(SDT.__file__)),
+        capture_output=True, text=True, check=True).stdout)
+
+def measure_startup(function_name, repeat):
+    if function_name in startup_script_dict:
+        script, memory_script = startup_script_dict[function_name]
+        run_import(script)
+        # Warms the OS file cache, and any SDT_CODE_TABLE_CACHE copy.
+        elapsed = min(run_import(script) for _ in range(repeat))
+        peak_bytes = run_import(memory_script, '-X', 'tracemalloc')
+    else:
+        elapsed = None
+        for _ in range(repeat):
+            start = time.perf_counter_ns()
+            SDT.reload_code_tables()
+            elapsed = min(elapsed or float('inf'),
+                          time.perf_counter_ns() - start)
+        tracemalloc.start()
+        SDT.reload_code_tables()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'records'        : 1,
+        'ns_per_record'  : elapsed,
+        'records_per_sec': 1e9 / elapsed if elapsed else None,
+        'peak_bytes'     : peak_bytes
+    }
+
+def group_corpus(corpus):
+    groups = {}
+    for record in corpus:
+        groups.setdefault('format:' + record.format, []).append(
+            record.docket_number)
+        groups.setdefault('kind:' + record.kind, []).append(
+            record.docket_number)
+    return dict(sorted(groups.items()))
+
+def run_benchmarks(size=20000, seed=0, repeat=5, functions=None):
+    groups = group_corpus(generate_corpus(size, seed))
+    results = []
+    for function_name in functions or startup_function_list:
+        if function_name in startup_function_list:
+            result = {'function': function_name, 'group': 'startup'}
+            result.update(measure_startup(function_name, repeat))
+            results.append(result)
+    for function_name in functions or benchmark_function_dict:
+        if function_name in startup_function_list:
+            continue
+        for group, docket_numbers in groups.items():
+            result = {'function': function_name, 'group': group}
+            result.update(measure(function_name, docket_numbers, repeat))
+            results.append(result)
+    return {
+        'version'  : results_format_version,
+        'python'   : platform.python_version(),
+        'platform' : platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'size'     : size,
+        'seed'     : seed,
+        'repeat'   : repeat,
+        'results'  : results
+    }
+
+def compare_results(old, new, threshold=0.1):
+    # Returns a list of (function, group, old ns/record, new ns/record,
+    # regressed) for every result in both runs.
+    old_results = {(result['function'], result['group']): result
+                   for result in old['results']}
+    comparison = []
+    for result in new['results']:
+        key = (result['function'], result['group'])
+        if key not in old_results:
+            continue
+        old_ns = old_results[key]['ns_per_record']
+        new_ns = result['ns_per_record']
+        comparison.append(key + (old_ns, new_ns,
+                                 new_ns > old_ns * (1 + threshold)))
+    return comparison
+
+def print_results(results, out=sys.stdout):
+    out.write('%-26s %-18s %12s %14s %12s\n' % (
+        'function', 'group', 'ns/record', 'records/sec', 'peak bytes'))
+    for result in results['results']:
+        out.write('%-26s %-18s %12.0f %14.0f %12d\n' % (
+            result['function'], result['group'], result['ns_per_record'],
+            result['records_per_sec'] or 0, result['peak_bytes']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run',
+                                     description='Benchmark SDT.py.')
+    parser.add_argument('--size', type=int, default=20000,
+                        help='docket numbers in the corpus')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--functions',
+                        help='comma-separated functions to benchmark, from: ' +
+                             ', '.join(startup_function_list +
+                                       list(benchmark_function_dict)))
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare',
+                        help='compare with the results in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+    functions = args.functions.split(',') if args.functions else None
+    for function_name in functions or []:
+        if function_name not in benchmark_function_dict and \
+                function_name not in startup_function_list:
+            parser.error('unknown function: ' + function_name)
+    results = run_benchmarks(args.size, args.seed, args.repeat, functions)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        regressed = False
+        print()
+        for function_name, group, old_ns, new_ns, slower in \
+                compare_results(old, results, args.threshold):
+            print('%-26s %-18s %10.0f -> %10.0f ns %s' % (
+                function_name, group, old_ns, new_ns,
+                'REGRESSION' if slower else ''))
+            regressed = regressed or slower
+        return 1 if regressed else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
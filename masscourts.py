@@ -0,0 +1,258 @@
+# Asynchronous docket-number lookups
+#
+#   masscourts.org only finds docket numbers entered strictly in the standard
+#   format (see ONLINE CASE ACCESS in SDT.py), so LookupClient normalizes each
+#   docket number with SDT.normalize_docket_number before looking it up, and
+#   then:
+#
+#       · answers from a TTL cache of earlier responses, if it can;
+#       · otherwise shares the lookup already in flight for the same docket
+#         number, if there is one;
+#       · otherwise waits for one of `concurrency` slots and a token from a
+#         token bucket (`rate` lookups a second, bursts of up to `burst`), and
+#         asks the backend, retrying failed lookups and 429 and 5xx responses
+#         with exponential backoff.
+#
+#   The backend is anything with `async fetch(docket_number)` returning
+#   (status, body) and `async close()`. HTTPBackend is an HTTP/1.1 backend
+#   with a pool of keep-alive connections; point url_template at masscourts.org
+#   or at a local stub server for testing:
+#
+#       async with LookupClient(HTTPBackend(
+#               'http://localhost:8080/search?docket={docket_number}')) as c:
+#           results = await c.lookup_many(['1577-CV-00982', '15H84CV436'])
+#
+#   Needs only the standard library.
+
+import asyncio
+import random
+import ssl
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import quote, urlsplit
+
+import SDT
+
+Lookup_Result = namedtuple('Lookup_Result', ['Docket_Number', 'Status',
+                                             'Body'])
+
+retry_status_set = frozenset([429, 500, 502, 503, 504])
+
+retry_exception_tuple = (OSError, asyncio.TimeoutError,
+                         asyncio.IncompleteReadError)
+# ConnectionError is an OSError.
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens +
+                                  (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class TTLCache:
+
+    def __init__(self, ttl, maxsize=100000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        # key -> (expiry time, value)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class HTTPBackend:
+
+    def __init__(self, url_template, max_connections=8, timeout=30,
+                 headers=None):
+        self.url_template = url_template
+        self.timeout = timeout
+        self.headers = headers or {}
+        url = urlsplit(url_template.format(docket_number=''))
+        self.host = url.hostname
+        self.ssl = ssl.create_default_context() if url.scheme == 'https' \
+            else None
+        self.port = url.port or (443 if self.ssl else 80)
+        self.host_header = url.netloc
+        self.slots = asyncio.Semaphore(max_connections)
+        self.idle = []
+        # (reader, writer) of open keep-alive connections
+
+    async def fetch(self, docket_number):
+        url = urlsplit(self.url_template.format(
+            docket_number=quote(docket_number)))
+        target = (url.path or '/') + ('?' + url.query if url.query else '')
+        request = ['GET ' + target + ' HTTP/1.1', 'Host: ' + self.host_header,
+                   'Connection: keep-alive']
+        request += [name + ': ' + value for name, value in
+                    self.headers.items()]
+        request = ('\r\n'.join(request) + '\r\n\r\n').encode('latin-1')
+        async with self.slots:
+            return await asyncio.wait_for(self.send(request), self.timeout)
+
+    async def send(self, request):
+        while self.idle:
+            reader, writer = self.idle.pop()
+            try:
+                return await self.exchange(reader, writer, request)
+            except retry_exception_tuple:
+                writer.close()
+                # The server closed the idle connection; try another.
+            except BaseException:
+                writer.close()
+                raise
+        reader, writer = await asyncio.open_connection(self.host, self.port,
+                                                       ssl=self.ssl)
+        try:
+            return await self.exchange(reader, writer, request)
+        except BaseException:
+            writer.close()
+            raise
+
+    async def exchange(self, reader, writer, request):
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = version == 'HTTP/1.1' and \
+            headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if not size:
+                    while (await reader.readline()) not in (b'\r\n', b'\n',
+                                                            b''):
+                        pass
+                        # Trailers
+                    break
+                body += await reader.readexactly(size)
+                await reader.readline()
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+        return int(status), bytes(body).decode('utf-8', errors='replace')
+
+    async def close(self):
+        while self.idle:
+            writer = self.idle.pop()[1]
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except retry_exception_tuple:
+                pass
+
+class LookupClient:
+
+    def __init__(self, backend, concurrency=8, rate=5.0, burst=None,
+                 retries=3, backoff=0.5, cache_ttl=3600, cache_size=100000):
+        self.backend = backend
+        self.slots = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = TTLCache(cache_ttl, cache_size)
+        self.in_flight = {}
+        # docket number -> task looking it up
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self.backend.close()
+
+    async def lookup(self, docket_number, court_code=None,
+                     case_type_code=None):
+        # Raises ValueError for docket numbers that cannot be normalized, and
+        # the backend's exception if every retry fails.
+        normalized = SDT.normalize_docket_number(docket_number, court_code,
+                                                 case_type_code)
+        if not normalized:
+            raise ValueError('Cannot normalize docket number: ' +
+                             docket_number)
+        result = self.cache.get(normalized)
+        if result is not None:
+            return result
+        task = self.in_flight.get(normalized)
+        if task is None:
+            task = asyncio.ensure_future(self.fetch(normalized))
+            self.in_flight[normalized] = task
+            task.add_done_callback(
+                lambda task: self.in_flight.pop(normalized, None))
+        return await asyncio.shield(task)
+
+    async def fetch(self, docket_number):
+        attempt = 0
+        while True:
+            async with self.slots:
+                await self.bucket.acquire()
+                try:
+                    status, body = await self.backend.fetch(docket_number)
+                except retry_exception_tuple:
+                    if attempt >= self.retries:
+                        raise
+                    status = None
+            if status is not None and (status not in retry_status_set or
+                                       attempt >= self.retries):
+                break
+            await asyncio.sleep(self.backoff * 2 ** attempt *
+                                (0.5 + random.random() / 2))
+            attempt += 1
+        result = Lookup_Result(docket_number, status, body)
+        if status not in retry_status_set:
+            self.cache.set(docket_number, result)
+        return result
+
+    async def lookup_many(self, docket_numbers):
+        # Returns results in the order of docket_numbers, with the exception
+        # instead of a result for docket numbers that failed.
+        return await asyncio.gather(
+            *[self.lookup(docket_number) for docket_number in docket_numbers],
+            return_exceptions=True)
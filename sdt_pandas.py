@@ -0,0 +1,192 @@
+# Column-wide docket-number parsing for pandas and Arrow
+#
+#   Importing this module registers a `sdt` accessor on pandas Series:
+#
+#       import sdt_pandas
+#       parsed = df['docket'].sdt.parse()
+#
+#   parse (and parse_column, which also takes Arrow arrays) runs
+#   docket_number_re over the whole column at once with Arrow's regex kernel,
+#   then checks the codes and years against the code tables with Arrow compute
+#   functions, so no Python object is made per row. It returns a DataFrame
+#   with the same index as the Series and these columns:
+#
+#       Court, Type, Year, Number, Format, Status
+#                               As in SDT.parse_many's Case_Columns, except
+#                               that Court, Type, Year, and Number hold as much
+#                               as was parsed, as in SDT.parse_docket_number,
+#                               and Status is the lowercased ParseError name.
+#       Court_Name, Case_Type   Names of the codes, or null for bad codes.
+#       Valid                   The validity mask: True where Status is 'ok'.
+#
+#   Court_Name, Case_Type, Format, and Status are categoricals whose categories
+#   come from the code tables (see CODE TABLES in SDT.py), so they are the same
+#   for every column parsed; Court and Type are categoricals of the codes that
+#   appear in the column. Strings are Arrow-backed.
+#
+#   Statuses match SDT.parse_docket_number's, with one difference: Arrow's
+#   regular expressions (RE2) take \d to mean only 0-9, where Python's re also
+#   takes other Unicode digits. Rows are parsed batch_size at a time, as
+#   matching makes one string array per group in docket_number_re.
+#
+#   Needs pandas and pyarrow.
+
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import SDT
+
+docket_number_arrow_pattern = '(?i)^(?:' + SDT.docket_number_pattern + ')$'
+# docket_number_re has no lookarounds or backreferences, so RE2 can run it.
+
+parse_column_name_list = ['Court', 'Type', 'Year', 'Number', 'Format',
+                          'Status', 'Court_Name', 'Case_Type', 'Valid']
+
+status_name_list = [error.name.lower() for error in SDT.ParseError]
+
+def unique_names(*code_dicts):
+    return list(dict.fromkeys(name for code_dict in code_dicts
+                              for name in code_dict.values()))
+
+def code_name_ordinals(code_dict, names):
+    # Returns (codes, ordinal in names of each code's name) as Arrow arrays.
+    name_ordinals = {name: i for i, name in enumerate(names)}
+    return (pa.array(list(code_dict)),
+            pa.array([name_ordinals[name] for name in code_dict.values()],
+                     pa.int32()))
+
+def lookup_names(codes, code_dict, names):
+    # Ordinal in names of the name of each code, or null.
+    value_set, ordinals = code_name_ordinals(code_dict, names)
+    return pc.take(ordinals, pc.index_in(codes, value_set=value_set))
+
+def group(match, name):
+    # The text a group matched, or null if it did not take part.
+    text = pc.struct_field(match, name)
+    return pc.if_else(pc.equal(text, ''), pa.scalar(None, pa.string()), text)
+
+def field(match, field_index):
+    # Coalesces one field (court, type, year, or number) across the formats.
+    names = [groups[field_index] for groups in
+             SDT.docket_number_format_groups.values() if groups[field_index]]
+    return pc.coalesce(*[group(match, name) for name in names])
+
+def dictionary(indices, values):
+    return pa.DictionaryArray.from_arrays(
+        pc.cast(indices, pa.int32()), pa.array(values, pa.string()))
+
+def parse_batch(array, current_year):
+    # Returns a list of Arrow arrays, in parse_column_name_list order.
+    match = pc.extract_regex(array, docket_number_arrow_pattern)
+    matched = pc.is_valid(match)
+    is_format = {docket_format: pc.is_valid(group(match, docket_format))
+                 for docket_format in SDT.docket_format_list}
+    # group is null where match is, so these have no nulls.
+    def when(conditions, values):
+        # The value for the first true condition in each row, or null.
+        return pc.case_when(pc.make_struct(*[
+            pc.fill_null(condition, False) for condition in conditions]),
+            *values)
+    formats = when([is_format[docket_format] for docket_format in
+                    SDT.docket_format_list],
+                   [pa.scalar(i, pa.int8()) for i in
+                    range(len(SDT.docket_format_list))])
+    court = pc.utf8_upper(field(match, 0))
+    case_type_code = pc.utf8_upper(field(match, 1))
+    year = field(match, 2)
+    number = field(match, 3)
+    case_group = pc.utf8_upper(group(match, 'probate_group'))
+    is_land = pc.or_(is_format['land'], is_format['sbq'])
+    is_appellate = pc.or_(pc.or_(is_format['appeals'], is_format['sjc']),
+                          is_format['sj'])
+    is_trial = pc.or_(is_format['trial'], is_format['housing'])
+    court_names = unique_names(SDT.court_name_code_dict,
+                               SDT.appellate_court_code_dict) + ['Land Court']
+    probate_court_dict = {code: SDT.court_name_code_dict[code] for code in
+                          SDT.court_name_code_dict
+                          if code in SDT.probate_family_court_code_set}
+    court_name = when(
+        [is_land, is_appellate, is_format['probate'], is_trial],
+        [pa.scalar(len(court_names) - 1, pa.int32()),
+         lookup_names(court, SDT.appellate_court_code_dict, court_names),
+         lookup_names(court, probate_court_dict, court_names),
+         lookup_names(court, SDT.court_name_code_dict, court_names)])
+    case_type_names = unique_names(
+        SDT.court_case_type_code_dict, SDT.land_court_case_type_code_dict,
+        SDT.probate_family_court_case_type_code_dict) + ['Appellate']
+    case_type = when(
+        [is_land, is_appellate, is_format['probate'], is_trial],
+        [lookup_names(case_type_code, SDT.land_court_case_type_code_dict,
+                      case_type_names),
+         pa.scalar(len(case_type_names) - 1, pa.int32()),
+         lookup_names(case_type_code,
+                      SDT.probate_family_court_case_type_code_dict,
+                      case_type_names),
+         lookup_names(case_type_code, SDT.court_case_type_code_dict,
+                      case_type_names)])
+    bad_court = pc.and_(matched, pc.is_null(court_name))
+    case_type = pc.if_else(bad_court, pa.scalar(None, pa.int32()), case_type)
+    bad_case_type = pc.and_(matched, pc.is_null(case_type))
+    bad_case_group = pc.invert(pc.is_in(
+        case_group, value_set=pa.array(
+            list(SDT.probate_family_court_case_group_code_dict))))
+    group_type_mismatch = pc.invert(pc.is_in(
+        pc.binary_join_element_wise(case_type_code, case_group, ''),
+        value_set=pa.array([code + case_group_code for code, groups in
+                            SDT.probate_family_court_case_type_group_dict
+                            .items() for case_group_code in groups])))
+    year = pc.if_else(pc.equal(pc.utf8_length(year), 2),
+                      pc.binary_join_element_wise(current_year[:2], year, ''),
+                      year)
+    future_year = pc.greater(year, current_year)
+    status = pc.fill_null(when(
+        [pc.invert(matched), bad_court, bad_case_type,
+         pc.and_(is_format['probate'], bad_case_group),
+         pc.and_(is_format['probate'], group_type_mismatch), future_year],
+        [pa.scalar(int(error), pa.int8()) for error in [
+            SDT.ParseError.NO_MATCH, SDT.ParseError.BAD_COURT_CODE,
+            SDT.ParseError.BAD_CASE_TYPE, SDT.ParseError.BAD_CASE_GROUP,
+            SDT.ParseError.GROUP_TYPE_MISMATCH,
+            SDT.ParseError.FUTURE_YEAR]]),
+        pa.scalar(int(SDT.ParseError.OK), pa.int8()))
+    return [pc.dictionary_encode(court), pc.dictionary_encode(case_type_code),
+            year, number, dictionary(formats, SDT.docket_format_list),
+            dictionary(status, status_name_list),
+            dictionary(court_name, court_names),
+            dictionary(case_type, case_type_names),
+            pc.equal(status, pa.scalar(int(SDT.ParseError.OK), pa.int8()))]
+
+def parse_column(values, current_year=None, batch_size=1 << 20):
+    # values is a pandas Series, or anything pyarrow.array takes, such as an
+    # Arrow array or chunked array of strings.
+    index = values.index if isinstance(values, pd.Series) else None
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = pa.array(values, pa.string(), from_pandas=True)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if values.type != pa.string():
+        values = pc.cast(values, pa.string())
+    current_year = current_year or time.strftime('%Y')
+    batches = [parse_batch(values.slice(start, batch_size), current_year)
+               for start in range(0, len(values), batch_size)] or \
+        [parse_batch(values, current_year)]
+    table = pa.Table.from_arrays(
+        [pa.chunked_array(columns) for columns in zip(*batches)],
+        parse_column_name_list)
+    frame = table.to_pandas(
+        types_mapper={pa.string(): pd.StringDtype('pyarrow')}.get)
+    if index is not None:
+        frame.index = index
+    return frame
+
+@pd.api.extensions.register_series_accessor('sdt')
+class DocketAccessor:
+
+    def __init__(self, series):
+        self.series = series
+
+    def parse(self, current_year=None, batch_size=1 << 20):
+        return parse_column(self.series, current_year, batch_size)
@@ -0,0 +1,644 @@
+# Regression tests for SDT.py
+#
+#   python -m pytest -q
+
+import gzip
+import os
+import random
+import subprocess
+import sys
+import time
+
+import pytest
+
+import SDT
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# The examples at the top of SDT.py, one or more per format.
+header_example_list = [
+    ('1577CV00982', 'trial', 'Essex County Superior Court', 'Civil', '2015',
+     '00982'),
+    ('1670CV000072', 'trial', 'Winchendon District Court', 'Civil', '2016',
+     '000072'),
+    ('1401CV001026', 'trial', 'Boston Municipal Court (BMC) Central', 'Civil',
+     '2014', '001026'),
+    ('15H84CV000436', 'housing', 'Boston Housing Court', 'Civil', '2015',
+     '000436'),
+    ('07 TL 001026', 'land', 'Land Court', 'Tax Lien', '2007', '001026'),
+    ('15 SBQ 00025 09-001', 'sbq', 'Land Court', 'Subsequent', '2015', '001'),
+    ('ES15A0064AD', 'probate', 'Essex Probate and Family Court', 'Adoption',
+     '2015', '0064'),
+    ('2020-P-0874', 'appeals', 'Appeals Court', 'Appellate', '2020', '0874'),
+    ('SJC-13103', 'sjc', 'Supreme Judicial Court', 'Appellate', None,
+     '13103'),
+    ('BD-2021-034', 'sj', 'Supreme Judicial Court (Bar Docket)', 'Appellate',
+     '2021', '034')
+]
+
+@pytest.mark.parametrize('docket_number, docket_format, court, case_type, '
+                         'year, number', header_example_list)
+def test_header_examples(docket_number, docket_format, court, case_type, year,
+                         number):
+    info = SDT.get_case_info(docket_number)
+    assert tuple(info) == (court, case_type, year, number, docket_format)
+    result = SDT.parse_docket_number(docket_number)
+    assert result.Error == SDT.ParseError.OK
+    assert result.Format == docket_format
+
+def test_header_examples_cover_every_format():
+    assert {example[1] for example in header_example_list} == \
+        set(SDT.docket_format_list)
+
+# Docket numbers with every ParseError, in upper and lower case.
+parse_error_example_list = [
+    '1577CV00982', '15h84cv000436', 'es15a0064ad', '2020-p-0874', 'sjc-13103',
+    '1599CV00982', '1577ZZ00982', 'ES15Z0064AD', 'ES15A0064XX',
+    'ES00A0000XY', '9977CV00982', 'bd-2999-034', '99 SBQ 1 01-1',
+    '1577CV00982x', '', 'junk'
+]
+
+def test_parse_many_matches_parse_docket_number():
+    columns = SDT.parse_many(parse_error_example_list)
+    assert set(columns.Status) == set(SDT.ParseError)
+    for i, docket_number in enumerate(parse_error_example_list):
+        result = SDT.parse_docket_number(docket_number)
+        assert columns.Status[i] == result.Error
+        fields = (result.Court, result.Type, result.Year, result.Number,
+                  result.Format)
+        if result.Error:
+            fields = (None,) * 5
+        assert tuple(column[i] for column in columns[:5]) == fields
+    assert SDT.parse_many(parse_error_example_list, SDT.ParseCache()) == \
+        columns
+
+def run_cli(*args, input=None, env=None):
+    return subprocess.run([sys.executable, os.path.join(here, 'SDT.py')] +
+                          list(args), input=input, env=env,
+                          capture_output=True, check=True).stdout
+
+def test_cli_reads_gzip_and_stdin(tmp_path):
+    data = '\n'.join(parse_error_example_list + ['   ']).encode('utf-8')
+    path = tmp_path / 'dockets.txt'
+    path.write_bytes(data)
+    gzip_path = tmp_path / 'dockets.txt.gz'
+    gzip_path.write_bytes(gzip.compress(data))
+    output = run_cli(str(path))
+    assert len(output.splitlines()) == len(parse_error_example_list) - 1
+    # The empty and blank lines are skipped.
+    assert run_cli(str(gzip_path)) == output
+    assert run_cli(input=data) == output
+    assert run_cli('-', input=gzip.compress(data)) == output
+
+def test_cli_csv_fields(tmp_path):
+    path = tmp_path / 'dockets.txt'
+    path.write_bytes(b'1577CV00982\nes15a0064ad\njunk\n')
+    assert run_cli(str(path), '--output-format', 'csv', '--fields',
+                   'Docket,Court,Status').decode().splitlines() == [
+        'Docket,Court,Status', '1577CV00982,77,ok', 'es15a0064ad,ES,ok',
+        'junk,,no_match']
+
+@pytest.mark.parametrize('output_format', ['jsonl', 'csv'])
+def test_parallel_cli_matches_serial(tmp_path, output_format):
+    lines = [example[0] for example in header_example_list] + \
+        parse_error_example_list + ['   ']
+    text = '\n'.join(lines * 20) + '\r\n1577CV\f00982\r15H84 CV436\n'
+    # \f and   are line breaks to str.splitlines, but not to files.
+    path = tmp_path / 'dockets.txt'
+    path.write_bytes(text.encode('utf-8'))
+    temp_directory = tmp_path / 'tmp'
+    temp_directory.mkdir()
+    serial = run_cli(str(path), '--output-format', output_format)
+    parallel = run_cli(str(path), '--output-format', output_format,
+                       '--workers', '2', '--chunk-size', '64',
+                       env=dict(os.environ, TMPDIR=str(temp_directory)))
+    assert parallel == serial
+    assert not os.listdir(temp_directory)
+
+def test_parse_cache_evicts_least_recently_used():
+    cache = SDT.ParseCache(maxsize=2)
+    for docket_number in ['1577CV00982', '2020-P-0874', '1577CV00982',
+                          'SJC-13103', '1577CV00982', '2020-P-0874']:
+        cache.parse(docket_number)
+    assert cache.cache_info() == (2, 4, 2, 2, 2)
+    assert list(cache.entries) == ['1577CV00982', '2020-P-0874']
+
+def test_parse_cache_clears_in_a_new_year(monkeypatch):
+    now = [time.mktime((2026, 12, 31, 23, 59, 0, 0, 0, -1))]
+    strftime = time.strftime
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    monkeypatch.setattr(time, 'strftime', lambda format, *args:
+                        strftime(format, time.localtime(now[0])))
+    cache = SDT.ParseCache()
+    assert cache.parse('2777CV00982').Error == SDT.ParseError.FUTURE_YEAR
+    assert cache.parse('2777CV00982').Error == SDT.ParseError.FUTURE_YEAR
+    now[0] += 120
+    assert cache.parse('2777CV00982').Error == SDT.ParseError.OK
+    assert cache.cache_info().misses == 2
+
+def test_parse_cache_clears_after_reload():
+    cache = SDT.ParseCache()
+    cache.parse('1577CV00982')
+    cache.parse('2020-P-0874')
+    SDT.reload_code_tables()
+    assert cache.parse('1577CV00982').Error == SDT.ParseError.OK
+    assert cache.cache_info() == (0, 3, 0, cache.maxsize, 1)
+
+@pytest.fixture
+def code_tables(monkeypatch, tmp_path):
+    # Returns write(change), which writes the code tables, changed by
+    # change(data), to a file and returns its path. The tables in use are put
+    # back after the test.
+    import json
+    SDT.use_code_tables()
+    names = SDT.code_table_name_list + list(SDT.code_indexes(
+        {name: getattr(SDT, name) for name in SDT.code_table_name_list})) + \
+        ['code_table_version', 'code_table_path', 'code_table_key']
+    for name in names:
+        monkeypatch.setattr(SDT, name, getattr(SDT, name))
+    with open(SDT.code_table_path, encoding='utf-8') as f:
+        text = f.read()
+    def write(change):
+        data = json.loads(text)
+        change(data)
+        path = tmp_path / ('sdt_codes_%d.json' % len(list(tmp_path.iterdir())))
+        path.write_text(json.dumps(data), encoding='utf-8')
+        return str(path)
+    return write
+
+def test_import_loads_nothing():
+    # In a fresh interpreter: the tables load, and each regex compiles, on
+    # first use, and references taken before then still work.
+    script = """if True:
+        import re, sys
+        import SDT
+        from SDT import court_name_code_dict, docket_number_search_re
+        assert SDT.code_table_version is None and 'json' not in sys.modules
+        assert isinstance(SDT.docket_number_re, SDT.Deferred)
+        assert court_name_code_dict['77'] == 'Essex County Superior Court'
+        assert SDT.code_table_version is not None
+        assert type(SDT.court_name_code_dict) is dict
+        assert '77' in court_name_code_dict and len(court_name_code_dict)
+        assert isinstance(SDT.docket_number_re, SDT.Deferred)
+        assert SDT.parse_docket_number('1577CV00982').Error == 0
+        assert isinstance(SDT.docket_number_re, re.Pattern)
+        assert isinstance(SDT.docket_number_search_re, SDT.Deferred)
+        assert docket_number_search_re.search('No. 1577CV00982').group() \\
+            == '1577CV00982'
+        assert isinstance(SDT.docket_number_search_re, re.Pattern)
+        """
+    subprocess.run([sys.executable, '-c', script], cwd=here, check=True)
+
+def test_parse_many_loads_tables():
+    script = ("import SDT; "
+              "print(SDT.parse_many(['1577CV00982', 'ES15A0064AD']).Status)")
+    output = subprocess.run([sys.executable, '-c', script], cwd=here,
+                            check=True, capture_output=True, text=True).stdout
+    assert output.strip() == '[<ParseError.OK: 0>, <ParseError.OK: 0>]'
+
+def test_reload_appended_codes(code_tables):
+    def change(data):
+        data['version'] += '+ZZ'
+        data['court_case_type_code_dict']['ZZ'] = 'Test Case Type'
+        data['court_name_code_dict']['99'] = 'Test Court'
+    version = SDT.code_table_version
+    assert SDT.reload_code_tables(code_tables(change)) == version + '+ZZ'
+    assert SDT.parse_docket_number('1599ZZ00001').Error == SDT.ParseError.OK
+    assert SDT.parse_many(['1599ZZ00001']).Status == [SDT.ParseError.OK]
+    packed = SDT.pack_docket_number('1599ZZ00001')
+    assert SDT.unpack_docket_number(packed) == '1599ZZ00001'
+    assert SDT.pack_docket_number('1577CV00982') == packed_docket_number
+
+packed_docket_number = SDT.pack_docket_number('1577CV00982')
+
+def move_first_to_end(table):
+    code = next(iter(table))
+    table[code] = table.pop(code)
+
+@pytest.mark.parametrize('change, message', [
+    (lambda data: data['probate_family_court_case_type_code_dict'].update(
+        ZZ='Test Case Type'), 'No case groups for case type ZZ'),
+    (lambda data: data['appellate_court_code_dict'].pop('J'),
+     'Missing appellate court code J'),
+    (lambda data: data['court_case_type_code_dict'].pop('CV'),
+     'removed or reordered'),
+    (lambda data: move_first_to_end(data['court_name_code_dict']),
+     'removed or reordered'),
+    (lambda data: move_first_to_end(data['appellate_court_code_dict']),
+     'removed or reordered')
+])
+def test_reload_refuses_bad_tables(code_tables, change, message):
+    version, generation = SDT.code_table_version, SDT.code_table_generation
+    with pytest.raises(ValueError, match=message):
+        SDT.reload_code_tables(code_tables(change))
+    assert (SDT.code_table_version, SDT.code_table_generation) == \
+        (version, generation)
+    assert SDT.pack_docket_number('1577CV00982') == packed_docket_number
+    for docket_number, docket_format, *_ in header_example_list:
+        assert SDT.parse_docket_number(docket_number).Format == docket_format
+
+def test_parse_without_group_entries(monkeypatch):
+    # Installed by hand, tables can still lack entries; parsing reports
+    # errors instead of raising KeyError.
+    monkeypatch.setattr(SDT, 'probate_family_court_case_type_group_dict', {})
+    monkeypatch.setattr(SDT, 'appellate_court_code_dict', {})
+    for docket_number in ('ES15A0064AD', '2020-P-0874', 'SJC-13103'):
+        assert SDT.parse_docket_number(docket_number).Error
+        assert SDT.parse_many([docket_number]).Status[0]
+
+# SpineFrontier, Inc. v. Cummings Props. LLC, No. 1577CV00982 (see VARIATIONS)
+spinefrontier_variant_list = ['1577-CV-00982', '15-0982', '15-CV-00982',
+                              '2015-982', '2015-00982', '1577CV00982']
+
+@pytest.mark.parametrize('variant', spinefrontier_variant_list)
+def test_normalize_spinefrontier_variants(variant):
+    assert SDT.normalize_docket_number(variant, court_code='77',
+                                      case_type_code='CV') == '1577CV00982'
+
+@pytest.mark.parametrize('variant, docket_number', [
+    ('HD15-W0123WD', 'HD15W0123WD'), ('hs19 c45ca', 'HS19C0045CA'),
+    ('15H84-CV-436', '15H84CV000436')])
+def test_normalize_probate_h_codes(variant, docket_number):
+    # HD and HS are probate and family court codes, not Housing Court codes.
+    assert SDT.normalize_docket_number(variant) == docket_number
+    assert SDT.get_case_info(docket_number)
+
+@pytest.mark.parametrize('variant, docket_number', [
+    ('1577CV000982', '1577CV00982'), ('1577-CV-0000982', '1577CV00982'),
+    ('1670CV0000072', '1670CV000072'), ('ES15A00064AD', 'ES15A0064AD'),
+    ('2020-P-00874', '2020-P-0874'), ('07 TL 0001026', '07 TL 001026'),
+    ('BD-2021-0034', 'BD-2021-034')])
+def test_normalize_strips_extra_zeros(variant, docket_number):
+    assert SDT.normalize_docket_number(variant) == docket_number
+
+def test_normalize_rejects_long_sequence_numbers():
+    assert SDT.normalize_docket_number('1577-CV-1234567') is None
+    assert SDT.normalize_docket_number('15-CV-1234567', court_code='77') \
+        is None
+    assert SDT.normalize_docket_number('1577CV1234567') is None
+
+extraction_text = ('Civil action 1577CV00982, appeal No. 2020-P-0874 (see '
+                   'also SJC-13103 and 15H84-CV-436); filed 15 TL 1026.\n'
+                   'Nothing here: 1577CV0098212345, X1577CV00982.')
+
+def test_find_docket_numbers():
+    matches = list(SDT.find_docket_numbers(extraction_text))
+    assert [(match.text, match.docket_number) for match in matches] == [
+        ('1577CV00982', '1577CV00982'), ('2020-P-0874', '2020-P-0874'),
+        ('SJC-13103', 'SJC-13103'), ('15H84-CV-436', '15H84CV000436'),
+        ('15 TL 1026', '15 TL 001026'), ('1577CV0098212345', None)]
+    # Too long to be a docket number, so only matched as a variation.
+    for match in matches[:-1]:
+        assert extraction_text[match.start:match.end] == match.text
+        assert match.info == SDT.get_case_info(match.docket_number)
+    assert [match.text for match in SDT.find_docket_numbers(
+        extraction_text, variations=False)] == [
+            '1577CV00982', '2020-P-0874', 'SJC-13103', '15 TL 1026']
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 7, 64, 65, 200])
+def test_find_docket_numbers_across_chunks(chunk_size):
+    text = extraction_text * 3
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    assert list(SDT.find_docket_numbers(chunks)) == \
+        list(SDT.find_docket_numbers(text))
+
+def test_find_docket_numbers_at_every_split():
+    expected = list(SDT.find_docket_numbers(extraction_text))
+    for i in range(len(extraction_text) + 1):
+        assert list(SDT.find_docket_numbers(
+            [extraction_text[:i], extraction_text[i:]])) == expected
+
+def test_parse_errors():
+    for docket_number, error, span in [
+            ('1599CV00982', SDT.ParseError.BAD_COURT_CODE, (2, 4)),
+            ('1577ZZ00982', SDT.ParseError.BAD_CASE_TYPE, (4, 6)),
+            ('ES15Z0064AD', SDT.ParseError.BAD_CASE_GROUP, (4, 5)),
+            ('ES00A0000XY', SDT.ParseError.GROUP_TYPE_MISMATCH, (4, 5)),
+            ('9977CV00982', SDT.ParseError.FUTURE_YEAR, (0, 2)),
+            ('not a docket', SDT.ParseError.NO_MATCH, (0, 12))]:
+        result = SDT.parse_docket_number(docket_number)
+        assert (result.Error, result.Span) == (error, span)
+        if error == SDT.ParseError.NO_MATCH:
+            assert SDT.get_case_info(docket_number) is None
+        else:
+            with pytest.raises(Exception,
+                               match=SDT.parse_error_message_dict[error]):
+                SDT.get_case_info(docket_number)
+
+def test_parse_never_raises():
+    for docket_number in parse_error_example_list + [
+            '\u0661\u0665\u0667\u0667CV00982', 'ſjc-1', '1577CV' + '9' * 50,
+            'x' * 10000]:
+        assert isinstance(SDT.parse_docket_number(docket_number).Error,
+                          SDT.ParseError)
+
+def test_pack_round_trip():
+    docket_numbers = [example[0] for example in header_example_list] + [
+        'es15a0064ad', '15 SBQ 123456 12-999999']
+    rng = random.Random(0)
+    for _ in range(2000):
+        court = rng.choice(['77', '70', '01', 'H84'])
+        docket_numbers.append('%02d%s%s%0*d' % (
+            rng.randrange(100) % 20, court, rng.choice(['CV', 'CR', 'SU']),
+            5 if court == '77' else 6, rng.randrange(1, 100000)))
+    packed = SDT.pack_many(docket_numbers)
+    for docket_number, value in zip(docket_numbers, packed):
+        assert value == SDT.pack_docket_number(docket_number)
+        assert SDT.unpack_docket_number(value) == docket_number.upper()
+        info = SDT.get_case_info(docket_number)
+        if info.Format != 'sbq':
+            assert SDT.unpack_case_info(value) == info
+
+def test_pack_sorts_by_fields():
+    docket_numbers = ['1577CV00982', '1477CV00983', '1577CV00981',
+                      '1577CR00982', '1570CV000982', '15H84CV000436',
+                      '2020-P-0874', '07 TL 001026', 'ES15A0064AD']
+    def key(docket_number):
+        info = SDT.get_case_info(docket_number)
+        return (SDT.docket_format_list.index(info.Format),
+                SDT.court_code_ordinal_dict.get(info.Court_Code, -1),
+                SDT.case_type_code_ordinal_dict.get(info.Format, {}).get(
+                    info.Type_Code, -1),
+                info.Year, int(info.Number))
+    assert sorted(docket_numbers, key=SDT.pack_docket_number) == \
+        sorted(docket_numbers, key=key)
+
+def test_pack_many_marks_unpackable():
+    assert list(SDT.pack_many(['1577CV00982', 'junk', '1599CV00982',
+                               '1577CV00982'])) == [
+        SDT.pack_docket_number('1577CV00982'), 0, 0,
+        SDT.pack_docket_number('1577CV00982')]
+    with pytest.raises(ValueError):
+        SDT.pack_docket_number('1577CV1234567')
+
+def test_case_info_is_slotted():
+    info = SDT.get_case_info('1577CV00982')
+    assert not hasattr(info, '__dict__')
+    assert info.Court_Code == '77' and info.Type_Code == 'CV'
+    assert info == SDT.unpack_case_info(SDT.pack_docket_number('1577CV00982'))
+    assert len({info, SDT.get_case_info('1577cv00982')}) == 1
+
+def test_docket_index(tmp_path):
+    path = str(tmp_path / 'dockets.db')
+    docket_numbers = ['19H84SU%06d' % number for number in range(1, 1001)] + \
+        ['19H84CV000500', '18H84SU000500', '07 TL 001026', 'SJC-13103',
+         'junk', '1599CV00982', '  19h84su000007  ']
+    with SDT.DocketIndex(path) as index:
+        assert index.add(docket_numbers, block_size=100) == 1004
+        # Not junk, 1599CV00982, or 19h84su000007 a second time.
+        assert index.add(docket_numbers) == 0
+        assert list(index.query(court='H84', case_type='SU', year=2019,
+                                number_range=(400, 403))) == [
+            '19H84SU000400', '19H84SU000401', '19H84SU000402',
+            '19H84SU000403']
+        assert index.count(court='h84', case_type='su', year='2019') == 1000
+        assert index.count(court='H84', number_range=(500, 500)) == 3
+        assert list(index.query(court='')) == ['07 TL 001026']
+        assert list(index.query(year=0)) == ['SJC-13103']
+        assert index.count(docket_format='housing') == 1002
+    with SDT.DocketIndex(path) as index:
+        assert index.count() == 1004
+
+def test_cluster_spinefrontier_variants():
+    mentions = [('SpineFrontier', variant)
+                for variant in spinefrontier_variant_list]
+    clusters, unresolved = SDT.cluster_docket_mentions(mentions)
+    assert unresolved == []
+    assert len(clusters) == 1
+    assert clusters[0].Docket_Number == '1577CV00982'
+    assert clusters[0].Mentions == list(range(len(mentions)))
+
+def test_cluster_leaves_bad_mentions_unresolved():
+    clusters, unresolved = SDT.cluster_docket_mentions(
+        ['1577-CV-1234567', '1599CV00982', '1577-CV-00982', '15-0982'])
+    assert [cluster.Docket_Number for cluster in clusters] == ['1577CV00982']
+    assert unresolved == [0, 1, 3]
+    # 15-0982 has no document to resolve it in.
+
+def test_cluster_resolves_ambiguous_years_from_context():
+    # 2015-982 is case 982 of 2015, or of 2020 in Brockton District Court.
+    def cluster(*texts):
+        clusters, unresolved = SDT.cluster_docket_mentions(
+            [('d', text) for text in texts])
+        return ([(cluster.Docket_Number, cluster.Mentions)
+                 for cluster in clusters], unresolved)
+    assert cluster('2015CV000982', '2015-982') == \
+        ([('2015CV000982', [0, 1])], [])
+    assert cluster('2015-982', '1577CV00982') == \
+        ([('1577CV00982', [0, 1])], [])
+    assert cluster('1577CV00982', '2015CV000982', '2015-982') == \
+        ([('1577CV00982', [0]), ('2015CV000982', [1])], [2])
+
+@pytest.mark.parametrize('garbled, docket_number, cost', [
+    ('1S77CV0O982', '1577CV00982', 1.0),
+    ('15H8ACV000436', '15H84CV000436', 0.5),
+    ('1577C00982', '1577CV00982', 1.0), ('15777CV00982', '1577CV00982', 1.0),
+    ('577CV00982', '1577CV00982', 1.0), ('1577CV0098#2', '1577CV00982', 1.0),
+    ('ES15A0O64AD', 'ES15A0064AD', 0.5), ('2020-P-O874', '2020-P-0874', 0.5)])
+def test_correct_docket_number(garbled, docket_number, cost):
+    corrections = SDT.correct_docket_number(garbled)
+    assert (docket_number, cost) in corrections
+    assert corrections == sorted(corrections,
+                                 key=lambda correction: correction[::-1])
+    for correction in corrections:
+        assert not SDT.parse_docket_number(correction.Docket_Number).Error
+
+def test_correct_docket_number_skips_implausible_years():
+    corrections = SDT.correct_docket_number('1577C00982', limit=100)
+    assert not [correction for correction in corrections
+                if correction.Docket_Number.startswith('1577-')]
+
+@pytest.mark.parametrize('docket_number, docket_format',
+                         [example[:2] for example in header_example_list])
+def test_docket_prefix_header_examples(docket_number, docket_format):
+    prefix = SDT.DocketPrefix()
+    for i, char in enumerate(docket_number):
+        assert prefix.alive
+        assert not prefix.complete or SDT.docket_number_re.fullmatch(
+            docket_number[:i])
+        prefix = prefix.feed(char)
+    assert prefix.complete
+    assert docket_format in prefix.formats
+    assert SDT.DocketPrefix().feed(docket_number.lower()).complete
+
+def test_docket_prefix_fields_and_candidates():
+    prefix = SDT.DocketPrefix().feed('15H8')
+    assert prefix.formats == {'housing'}
+    assert prefix.fields == {'year': '15'}
+    assert prefix.candidates('court') == {'H83', 'H84', 'H85'}
+    assert prefix.court_names == {SDT.court_name_code_dict[code]
+                                  for code in ('H83', 'H84', 'H85')}
+    complete = prefix.feed('4CV000436')
+    assert complete.complete
+    assert complete.fields == {'year': '15', 'court': 'H84', 'type': 'CV'}
+    assert not prefix.complete
+    # feed returns a new DocketPrefix, so keeping the old one undoes it.
+    assert SDT.DocketPrefix().feed('BD-2021-0').candidates('court') == {'BD'}
+
+def test_docket_prefix_dies():
+    assert not SDT.DocketPrefix().feed('15H84CV0004361').alive
+    assert not SDT.DocketPrefix().feed('1577XQ').alive
+    assert not SDT.DocketPrefix().feed('#').alive
+    assert not SDT.DocketPrefix().feed('15H84CV').complete
+
+@pytest.fixture
+def instrumentation():
+    yield
+    SDT.disable_instrumentation()
+
+def test_instrumented_parsing_matches(instrumentation):
+    docket_numbers = parse_error_example_list + [
+        example[0] for example in header_example_list]
+    results = [SDT.parse_docket_number(docket_number)
+               for docket_number in docket_numbers]
+    columns = SDT.parse_many(docket_numbers)
+    case_type = SDT.identify_case_type('1577CV00982')
+    stats = SDT.enable_instrumentation(SDT.ParseStats(slowest_size=3))
+    assert [SDT.parse_docket_number(docket_number)
+            for docket_number in docket_numbers] == results
+    assert SDT.parse_many(docket_numbers) == columns
+    assert SDT.identify_case_type('1577CV00982') == case_type
+    assert SDT.disable_instrumentation() is stats
+    assert SDT.disable_instrumentation() is None
+    assert SDT.parse_docket_number is not SDT.profile_parse_docket_number
+    parses = 2 * len(docket_numbers)
+    assert stats.parses == sum(stats.latency_buckets) == parses
+    assert sum(stats.error_counts.values()) == parses
+    assert stats.error_counts[SDT.ParseError.NO_MATCH] == 2 * sum(
+        result.Error == SDT.ParseError.NO_MATCH for result in results)
+    assert stats.format_counts['probate'] == 2 * sum(
+        result.Format == 'probate' for result in results)
+    assert stats.stage_calls[0] == parses
+    assert stats.stage_calls[SDT.parse_stage_list.index('type')] == \
+        parses - stats.error_counts[SDT.ParseError.NO_MATCH] + 1
+    # The identify_case_type call
+    assert [elapsed for elapsed, _ in sorted(stats.slowest)] == sorted(
+        elapsed for elapsed, _ in stats.slowest)
+    assert len(stats.slowest) == 3
+
+def test_instrumentation_sink_and_reports(instrumentation):
+    import json
+    flushes = []
+    stats = SDT.enable_instrumentation(SDT.ParseStats(
+        lambda stats: flushes.append(stats.parses), flush_every=4))
+    assert SDT.enable_instrumentation(stats) is stats
+    for docket_number in parse_error_example_list[:10]:
+        SDT.parse_docket_number(docket_number)
+    assert flushes == [4, 8]
+    SDT.disable_instrumentation()
+    assert flushes == [4, 8, 10]
+    snapshot = json.loads(stats.json_snapshot())
+    assert snapshot['parses'] == 10
+    assert snapshot['stages']['format']['calls'] == 10
+    assert sum(snapshot['errors'].values()) == 10
+    assert sum(bucket['count']
+               for bucket in snapshot['latency_buckets']) == 10
+    assert snapshot['latency_buckets'][-1]['le_ns'] is None
+    text = stats.prometheus_text()
+    assert text.endswith('\n')
+    assert '# TYPE sdt_parse_duration_seconds histogram' in text.splitlines()
+    assert 'sdt_parse_duration_seconds_bucket{le="+Inf"} 10' in text
+    assert 'sdt_parse_duration_seconds_count 10' in text
+    assert 'sdt_parse_errors_total{error="ok"} %d' % snapshot['errors'][
+        'ok'] in text
+    assert 'sdt_parse_errors_total{error="no_match"} 0' in text
+    stats.reset()
+    assert stats.snapshot()['parses'] == 0
+
+def test_cli_stats():
+    import json
+    output = subprocess.run(
+        [sys.executable, os.path.join(here, 'SDT.py'), '--stats', 'json'],
+        input=b'1577CV00982\njunk\n', capture_output=True, check=True)
+    snapshot = json.loads(output.stderr)
+    assert snapshot['formats'] == {'trial': 1, 'none': 1}
+    assert snapshot['errors'] == {'ok': 1, 'no_match': 1}
+
+def test_docket_coverage():
+    coverage = SDT.DocketCoverage()
+    docket_numbers = ['1577CV%05d' % i for i in
+                      list(range(1, 7)) + list(range(8, 50)) + [52, 3]]
+    added = coverage.add(docket_numbers + ['junk', '15 SBQ 12345 07-001',
+                                           '2020-P-0874', 'ES15A0064AD',
+                                           ' 15H84CV000436\n'],
+                         block_size=7)
+    assert added == len(docket_numbers) + 3
+    assert len(coverage) == len(docket_numbers) + 2
+    assert set(coverage.keys()) == {('77', 'CV', '2015', None),
+                                    ('P', None, '2020', None),
+                                    ('ES', 'AD', '2015', 'A'),
+                                    ('H84', 'CV', '2015', None)}
+    assert list(coverage.gaps('77', 'cv', 15)) == [(7, 8), (50, 52)]
+    assert list(coverage.gaps('77', 'CV', '2015', stop=55)) == \
+        [(7, 8), (50, 52), (53, 55)]
+    assert coverage.next_unseen('77', 'CV', '2015') == 7
+    assert coverage.next_unseen('77', 'CV', '2015', start=8) == 50
+    assert coverage.count('77', 'CV', '2015') == len(docket_numbers) - 1
+    assert list(coverage.missing_docket_numbers('77', 'CV', '2015')) == \
+        ['1577CV00007', '1577CV00050', '1577CV00051']
+    assert list(coverage.missing_docket_numbers('H84', 'CV', '2015',
+                                                stop=3)) == \
+        ['15H84CV000001', '15H84CV000002']
+    assert list(coverage.missing_docket_numbers('ES', 'AD', '2015', 'a',
+                                                stop=2)) == ['ES15A0001AD']
+    assert next(coverage.missing_docket_numbers('P', None, '2020')) == \
+        '2020-P-0001'
+    assert list(coverage.gaps('77', 'CV', '2016')) == []
+    assert coverage.nbytes() > 0
+
+def test_sequence_bitmap_matches_a_set():
+    generator = random.Random(5)
+    numbers = set(range(65530, 65545)) | set(range(200000, 210000)) | {
+        generator.randrange(1 << 32) for _ in range(3000)} | {
+        generator.randrange(1 << 17) for _ in range(6000)}
+    numbers = sorted(numbers)
+    bitmaps = [SDT.SequenceBitmap(numbers), SDT.SequenceBitmap()]
+    for number in numbers[::-1]:
+        assert bitmaps[1].add(number)
+    assert not bitmaps[1].add(numbers[0])
+    for bitmap in bitmaps:
+        assert len(bitmap) == len(numbers)
+        assert list(bitmap) == numbers
+        assert bitmap.max() == numbers[-1]
+        for number in numbers[::97] + [0, 65529, 65545, (1 << 32) - 1]:
+            assert (number in bitmap) == (number in set(numbers))
+        runs = list(bitmap.runs(60000, 300000))
+        assert (65530, 65545) in runs
+        assert (200000, 210000) in runs
+        assert sum(stop - first for first, stop in runs) == \
+            bitmap.count(60000, 300000) == \
+            sum(60000 <= number < 300000 for number in numbers)
+        gaps = list(bitmap.gaps(60000, 300000))
+        assert sum(stop - first for first, stop in gaps + runs) == 240000
+        assert all(first not in bitmap and stop - 1 not in bitmap
+                   for first, stop in gaps)
+        assert bitmap.next_unseen(65530) == 65545
+        assert bitmap.next_unseen(65529) in (65529, 65545)
+    assert SDT.SequenceBitmap().max() is None
+    assert list(SDT.SequenceBitmap().gaps(1, 4)) == [(1, 4)]
+
+def test_sequence_bitmap_containers():
+    bitmap = SDT.SequenceBitmap()
+    for number in range(SDT.array_container_size + 1):
+        bitmap.add(number * 2)
+    assert isinstance(bitmap.containers[0], SDT.BitmapContainer)
+    assert bitmap.nbytes() == 2 + 8192
+    bitmap = SDT.SequenceBitmap()
+    for number in range(1, 3001):
+        bitmap.add(number)
+    assert isinstance(bitmap.containers[0], SDT.ArrayContainer)
+    assert bitmap.nbytes() == 2 + 6000
+    bitmap.optimize()
+    assert isinstance(bitmap.containers[0], SDT.RunContainer)
+    assert bitmap.nbytes() == 2 + 4
+    assert list(bitmap.runs()) == [(1, 3001)]
+    bitmap.add(3002)
+    assert list(bitmap.runs()) == [(1, 3001), (3002, 3003)]
+    for number in (3001, 0, 3003, 5000):
+        bitmap.add(number)
+    # Joins two runs, extends one down, then up, and starts one.
+    assert list(bitmap.runs()) == [(0, 3004), (5000, 5001)]
+    assert len(bitmap) == 3005
+    sparse = SDT.SequenceBitmap(range(0, 20000, 7))
+    assert isinstance(sparse.containers[0], SDT.ArrayContainer)
+    assert list(sparse) == list(range(0, 20000, 7))
@@ -0,0 +1,167 @@
+# Tests for masscourts.py, against a stub HTTP server on localhost
+#
+#   python -m pytest -q
+
+import asyncio
+import time
+
+import pytest
+
+import masscourts
+
+class StubServer:
+    # Answers GET /search?docket=... with respond(docket number, request
+    # count), which returns (status, body, options); options may have
+    # 'chunked', 'close', and 'delay' (seconds). Records the docket number of
+    # each request and the number of connections opened and still open.
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self.connections = 0
+        self.open_connections = 0
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return 'http://127.0.0.1:%d/search?docket={docket_number}' % port
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.open_connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                while (await reader.readline()) not in (b'\r\n', b''):
+                    pass
+                docket_number = request_line.split()[1].decode().split('=')[1]
+                self.requests.append(docket_number)
+                status, body, options = self.respond(docket_number,
+                                                     len(self.requests))
+                body = body.encode()
+                head = 'HTTP/1.1 %d X\r\n' % status
+                if options.get('close'):
+                    head += 'Connection: close\r\n'
+                if options.get('chunked'):
+                    head += 'Transfer-Encoding: chunked\r\n\r\n'
+                    body = b''.join(b'%x\r\n%s\r\n' % (len(part), part)
+                                    for part in (body[:3], body[3:])
+                                    if part) + b'0\r\n\r\n'
+                else:
+                    head += 'Content-Length: %d\r\n\r\n' % len(body)
+                if options.get('delay'):
+                    try:
+                        if not await asyncio.wait_for(reader.read(1),
+                                                      options['delay']):
+                            break
+                            # The client gave up and closed the connection.
+                    except asyncio.TimeoutError:
+                        pass
+                writer.write(head.encode() + body)
+                await writer.drain()
+                if options.get('close'):
+                    break
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+def run(respond, test, **client_options):
+    # Runs test(client, server) against a StubServer, closing both after.
+    async def main():
+        server = StubServer(respond)
+        url_template = await server.start()
+        try:
+            client = masscourts.LookupClient(
+                masscourts.HTTPBackend(url_template, max_connections=2,
+                                       timeout=0.2),
+                **dict(dict(rate=1000, backoff=0.001), **client_options))
+            async with client:
+                await test(client, server)
+            await asyncio.sleep(0.05)
+            # Let the server see the connections close.
+            assert server.open_connections == 0
+        finally:
+            await server.stop()
+    asyncio.run(main())
+
+def found(docket_number, count):
+    return 200, 'found ' + docket_number, {}
+
+def test_lookup_normalizes_and_caches():
+    async def test(client, server):
+        result = await client.lookup('1577-CV-00982')
+        assert result == ('1577CV00982', 200, 'found 1577CV00982')
+        assert await client.lookup('1577cv982') == result
+        assert server.requests == ['1577CV00982']
+        with pytest.raises(ValueError):
+            await client.lookup('junk')
+    run(found, test)
+
+def test_lookup_many_shares_requests_and_reuses_connections():
+    async def test(client, server):
+        docket_numbers = ['1577CV00982', '1577-CV-00982', '15H84CV436',
+                          'junk'] + ['1577CV%05d' % i for i in range(1, 21)]
+        results = await client.lookup_many(docket_numbers)
+        assert results[0] == results[1]
+        assert results[2].Docket_Number == '15H84CV000436'
+        assert isinstance(results[3], ValueError)
+        assert sorted(server.requests) == sorted(set(
+            result.Docket_Number for result in results
+            if not isinstance(result, Exception)))
+        assert server.connections <= 2
+    run(found, test)
+
+def test_lookup_retries_server_errors():
+    def respond(docket_number, count):
+        if count <= 2:
+            return 503, 'busy', {}
+        return 200, 'found', {'chunked': True}
+    async def test(client, server):
+        result = await client.lookup('1577CV00982')
+        assert (result.Status, result.Body) == (200, 'found')
+        assert len(server.requests) == 3
+    run(respond, test)
+
+def test_lookup_gives_up_after_retries():
+    async def test(client, server):
+        result = await client.lookup('1577CV00982')
+        assert result.Status == 503
+        assert len(server.requests) == 3
+        await client.lookup('1577CV00982')
+        assert len(server.requests) == 6
+        # Server errors are not cached.
+    run(lambda docket_number, count: (503, 'busy', {}), test, retries=2)
+
+def test_lookup_reconnects_when_the_server_closes():
+    async def test(client, server):
+        for i in range(1, 5):
+            result = await client.lookup('1577CV%05d' % i)
+            assert result.Status == 200
+        assert server.connections == 4
+    run(lambda docket_number, count: (200, 'found', {'close': True}), test)
+
+def test_lookup_rate_limit():
+    async def test(client, server):
+        start = time.monotonic()
+        await client.lookup_many(['1577CV%05d' % i for i in range(1, 7)])
+        assert time.monotonic() - start >= 0.09
+        # One token at once, then one every 20 ms.
+    run(found, test, rate=50, burst=1)
+
+def test_lookup_closes_timed_out_connections():
+    def respond(docket_number, count):
+        return 200, 'found', {'delay': 0.5 if count == 2 else 0}
+    async def test(client, server):
+        await client.lookup('1577CV00001')
+        with pytest.raises(asyncio.TimeoutError):
+            await client.lookup('1577CV00002')
+        # On the idle connection from the first lookup, which is closed
+        # rather than leaked.
+        assert server.connections == 1
+    run(respond, test, retries=0)
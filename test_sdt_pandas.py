@@ -0,0 +1,63 @@
+# Tests for sdt_pandas.py, which needs pandas and pyarrow
+#
+#   python -m pytest -q
+
+import pytest
+
+pd = pytest.importorskip('pandas')
+pa = pytest.importorskip('pyarrow')
+
+import SDT
+import sdt_pandas
+
+docket_number_list = [
+    '1577CV00982', '15h84cv000436', '15 SBQ 12345 07-001', '15 MISC 000123',
+    'es15a0064ad', '2020-p-0874', 'sjc-13103', 'BD-2021-034', '1599CV00982',
+    '1577ZZ00982', 'ES15Z0064AD', 'ES15A0064XX', 'ES00A0000XY', 'SU15A0064AD',
+    '9977CV00982', 'bd-2999-034', '1577CV00982x', '1577-CV-00982', '', 'junk'
+]
+
+def value(x):
+    return None if pd.isna(x) else x
+
+def test_parse_matches_parse_docket_number():
+    frame = pd.Series(docket_number_list).sdt.parse()
+    assert list(frame.columns) == sdt_pandas.parse_column_name_list
+    assert set(frame.Status) == set(sdt_pandas.status_name_list)
+    for i, docket_number in enumerate(docket_number_list):
+        result = SDT.parse_docket_number(docket_number)
+        row = [value(x) for x in frame.iloc[i]]
+        assert row == [result.Court, result.Type, result.Year, result.Number,
+                       result.Format, result.Error.name.lower(),
+                       result.Court_Name, result.Case_Type,
+                       result.Error == SDT.ParseError.OK], docket_number
+
+def test_parse_keeps_index_and_nulls():
+    series = pd.Series(['1577CV00982', None, 'junk'], index=[10, 'b', 30])
+    frame = series.sdt.parse()
+    assert list(frame.index) == [10, 'b', 30]
+    assert list(frame.Status) == ['ok', 'no_match', 'no_match']
+    assert list(frame.Valid) == [True, False, False]
+    assert value(frame.Court['b']) is None
+    assert sdt_pandas.parse_column(pa.array(['1577CV00982'])).index.tolist() \
+        == [0]
+
+def test_parse_categories():
+    one = pd.Series(['1577CV00982']).sdt.parse()
+    other = pd.Series(['ES15A0064AD', '2020-P-0874']).sdt.parse()
+    for name in ['Court_Name', 'Case_Type', 'Format', 'Status']:
+        assert isinstance(one[name].dtype, pd.CategoricalDtype)
+        assert list(one[name].cat.categories) == \
+            list(other[name].cat.categories)
+    assert tuple(one.Format.cat.categories) == SDT.docket_format_list
+    assert list(one.Status.cat.categories) == sdt_pandas.status_name_list
+    assert list(other.Court.cat.categories) == ['ES', 'P']
+
+def test_parse_batches_and_current_year():
+    series = pd.Series(docket_number_list * 3)
+    frame = series.sdt.parse()
+    pd.testing.assert_frame_equal(series.sdt.parse(batch_size=7), frame)
+    frame = pd.Series(['1577CV00982', '1677CV00982']).sdt.parse(
+        current_year='2015')
+    assert list(frame.Status) == ['ok', 'future_year']
+    assert list(frame.Year) == ['2015', '2016']